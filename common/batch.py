@@ -0,0 +1,210 @@
+import os
+from array import array
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from multiprocessing import shared_memory
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Type, Union,
+)
+
+from common.intcode import BaseParserError, MemoryFault, Program
+
+# Image of the worker process, parsed once by the pool initializer
+_image = None  # type: Union[None, List[int], SharedImage]
+
+
+class SharedImage:
+    """
+    Read-only program image published once in shared memory as packed int64.
+
+    Processes attach to it by name, the programs they build with ``memory()`` read the shared pages directly and
+    only copy the pages they write. Pickling an image attaches to it on the other side, so it can be given to a
+    pool as is. The process creating the image owns it and unlinks it when it is closed.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, size: int, owner: bool = False):
+        self._shm = shm
+        self.size = size
+        self.owner = owner
+        self._buffer = shm.buf.cast('q')
+        page_size = Program.PagedMemory.page_size
+        self._buffer = self._buffer[:len(self._buffer) // page_size * page_size]
+
+    @classmethod
+    def create(cls, image: Sequence[int]) -> "SharedImage":
+        """Publish ``image``, raises OverflowError when a value does not fit in 64 bits"""
+        data = array('q', image)
+        page_size = Program.PagedMemory.page_size
+        pages = max(1, -(-len(data) // page_size))
+        shm = shared_memory.SharedMemory(create=True, size=pages * page_size * data.itemsize)
+        shm.buf[:len(data) * data.itemsize] = data.tobytes()
+        shm.buf[len(data) * data.itemsize:] = bytes(len(shm.buf) - len(data) * data.itemsize)
+        return cls(shm, len(data), owner=True)
+
+    @classmethod
+    def attach(cls, name: str, size: int) -> "SharedImage":
+        return cls(shared_memory.SharedMemory(name=name), size)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __reduce__(self):
+        return self.__class__.attach, (self.name, self.size)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self._buffer[:self.size][item].tolist()
+        if not 0 <= item < self.size:
+            raise IndexError(item)
+        return self._buffer[item]
+
+    def memory(self) -> Program.PagedMemory:
+        """Paged memory reading this image until its pages are written"""
+        return Program.PagedMemory.from_buffer(self._buffer, self.size)
+
+    def close(self):
+        """Detach from the image, the memories built from it must be gone"""
+        self._buffer.release()
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    def __enter__(self) -> "SharedImage":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BatchJob(NamedTuple):
+    inputs: Sequence[int] = ()
+    patches: Optional[Dict[int, int]] = None
+
+
+class BatchResult(NamedTuple):
+    index: int
+    job: BatchJob
+    return_code: Optional[int]
+    outputs: Optional[List[int]]
+    error: Optional[BaseParserError]
+
+
+def _init_worker(image: Union[str, Sequence[int], SharedImage]):
+    global _image
+    if isinstance(image, str):
+        _image = Program.load_memory_from_file(image)
+    elif isinstance(image, SharedImage):
+        _image = image
+    else:
+        _image = list(image)
+
+
+def _run_chunk(fn: Callable[[List[int], Any], Any], chunk: List[Tuple[int, Any]]) -> List[Tuple[int, Any]]:
+    return [
+        (index, fn(_image, job))
+        for index, job in chunk
+    ]
+
+
+def map_image(
+    image: Union[str, Sequence[int], SharedImage],
+    fn: Callable[[List[int], Any], Any],
+    jobs: Iterable[Any],
+    max_workers: Optional[int] = None,
+    chunk_size: int = 64,
+    shared: bool = False,
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Call ``fn(image, job)`` for every job in a pool of processes, yielding ``(index, result)`` as they finish.
+
+    ``image`` is a filename or a memory image, each worker parses it once. With ``shared`` the image is parsed here
+    and published as a SharedImage instead, which is what ``fn`` gets. ``fn`` must be picklable and must not modify
+    the image it is given. Jobs are sent in chunks of ``chunk_size`` and only a few chunks per worker are in flight,
+    so ``jobs`` can be a long lazy iterable. Closing the iterator early cancels the jobs that did not start.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    shared_image = None
+    if shared and not isinstance(image, SharedImage):
+        if isinstance(image, str):
+            image = Program.load_memory_from_file(image)
+        image = shared_image = SharedImage.create(image)
+    jobs = enumerate(jobs)
+    executor = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(image,))
+    pending = set()  # type: Set[Future]
+
+    def submit():
+        chunk = list(islice(jobs, chunk_size))
+        if chunk:
+            pending.add(executor.submit(_run_chunk, fn, chunk))
+
+    try:
+        for _ in range(0, 2 * max_workers):
+            submit()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                submit()
+                yield from future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if shared_image is not None:
+            shared_image.close()
+
+
+def run_job(
+    image: Union[List[int], SharedImage],
+    job: BatchJob,
+    program_class: Type[Program] = Program,
+    **kwargs,
+) -> BatchResult:
+    """
+    Run one job on a copy of ``image``, the index of the result is filled by the caller.
+
+    A shared image is attached to as paged memory, only the pages written by the job are copied. Patches must be in
+    the image, the run resets what is past it: the job gets a MemoryFault otherwise.
+    """
+    outside = sorted(address for address in (job.patches or {}) if not 0 <= address < len(image))
+    if outside:
+        error = MemoryFault(f'Patches at {outside} are outside the {len(image)} cells of the image')
+        return BatchResult(-1, job, None, [], error)
+    if isinstance(image, SharedImage):
+        memory = image.memory()
+    else:
+        memory = list(image)
+    for address, value in (job.patches or {}).items():
+        memory[address] = value
+    program = program_class(memory, inputs=list(job.inputs), **kwargs)
+    try:
+        program.run()
+    except BaseParserError as e:
+        return BatchResult(-1, job, None, program.outputs, e)
+    return BatchResult(-1, job, program.return_code, program.outputs, None)
+
+
+def run_batch(
+    image: Union[str, Sequence[int], SharedImage],
+    jobs: Iterable[BatchJob],
+    program_class: Type[Program] = Program,
+    max_workers: Optional[int] = None,
+    chunk_size: int = 64,
+    shared: bool = False,
+    **kwargs,
+) -> Iterator[BatchResult]:
+    """
+    Run ``program_class`` on ``image`` once per job in a pool of processes, yielding the results as they finish.
+
+    Each job patches its own copy of the image then runs with its inputs, extra keyword arguments are given to the
+    program. Faults are returned in the result rather than raised. See map_image() for ``shared``.
+    """
+    fn = partial(run_job, program_class=program_class, **kwargs)
+    for index, result in map_image(
+        image, fn, jobs, max_workers=max_workers, chunk_size=chunk_size, shared=shared,
+    ):
+        yield result._replace(index=index)
@@ -0,0 +1,138 @@
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from common.bench.corpus import Case, corpus
+from common.intcode import Program
+
+# Program keyword arguments by configuration name, list memories are padded to what the case uses
+configurations = {
+    'list': {},
+    'dynamic': {'dynamic_memory': True},
+    'paged': {'dynamic_memory': 'paged'},
+    'compiled': {'engine': 'compiled'},
+    'transpiled': {'engine': 'transpiled'},
+}  # type: Dict[str, Dict[str, Any]]
+
+baseline_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+class Measure(NamedTuple):
+    case: str
+    configuration: str
+    instructions: int
+    seconds: float  # best wall time of the runs
+    instructions_per_second: float
+    peak_rss_kb: int  # of the process the case ran in
+    peak_allocated_bytes: int  # traced by tracemalloc during one more run
+    outputs: List[int]
+
+
+def program(case: Case, configuration: str) -> Program:
+    kwargs = configurations[configuration]
+    image = list(case.image)
+    for address, value in (case.patches or {}).items():
+        image[address] = value
+    if not kwargs.get('dynamic_memory'):
+        image += [0] * case.memory
+    return Program(image, inputs=list(case.inputs), **kwargs)
+
+
+def instructions(case: Case) -> int:
+    """Instructions executed by ``case``, the same in every configuration"""
+    count = 0
+
+    def tracer(_):
+        nonlocal count
+        count += 1
+
+    prog = program(case, 'list')
+    prog.set_tracer(tracer)
+    prog.run()
+    return count
+
+
+def _measure(case: Case, configuration: str, count: int, repeat: int, min_seconds: float) -> Measure:
+    # Short cases are run again until a measure lasts min_seconds, only run() is timed
+    best = float('inf')
+    prog = None
+    for _ in range(0, repeat):
+        runs = 0
+        elapsed = 0.0
+        while elapsed < min_seconds or not runs:
+            prog = program(case, configuration)
+            start = time.perf_counter()
+            prog.run()
+            elapsed += time.perf_counter() - start
+            runs += 1
+        best = min(best, elapsed / runs)
+
+    tracemalloc.start()
+    try:
+        program(case, configuration).run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return Measure(case.name, configuration, count, best, count / best, rss, peak, list(prog.outputs))
+
+
+def measure(
+    cases: Optional[Iterable[Case]] = None,
+    names: Optional[Iterable[str]] = None,
+    repeat: int = 3,
+    min_seconds: float = 0.05,
+) -> List[Measure]:
+    """
+    Run every case in every configuration (all of them or ``names``), each in a fresh process.
+
+    The best of ``repeat`` measures is kept, a measure runs the case as many times as needed to last ``min_seconds``.
+
+    Raises RuntimeError when a configuration outputs something else than the plain list memory.
+    """
+    names = list(configurations) if names is None else list(names)
+    rv = []
+    previous_cache_dir = os.environ.get('INTCODE_CACHE_DIR')
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ['INTCODE_CACHE_DIR'] = cache_dir  # transpiled modules, inherited by the workers
+        try:
+            for case in (corpus() if cases is None else cases):
+                count = instructions(case)
+                for name in names:
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        result = pool.submit(_measure, case, name, count, repeat, min_seconds).result()
+                    if rv and rv[-1].case == case.name and rv[-1].outputs != result.outputs:
+                        raise RuntimeError(f'{case.name} outputs differ between {rv[-1].configuration} and {name}')
+                    rv.append(result)
+        finally:
+            if previous_cache_dir is None:
+                del os.environ['INTCODE_CACHE_DIR']
+            else:
+                os.environ['INTCODE_CACHE_DIR'] = previous_cache_dir
+    return rv
+
+
+def compare(
+    measures: Iterable[Measure],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float = 0.25,
+) -> List[Tuple[str, str, float, float]]:
+    """(case, configuration, instructions per second, baseline) slower than the baseline by more than ``threshold``"""
+    rv = []
+    for m in measures:
+        expected = baseline.get(m.case, {}).get(m.configuration)
+        if expected is not None and m.instructions_per_second < expected * (1 - threshold):
+            rv.append((m.case, m.configuration, m.instructions_per_second, expected))
+    return rv
+
+
+def as_baseline(measures: Iterable[Measure]) -> Dict[str, Dict[str, float]]:
+    rv = {}
+    for m in measures:
+        rv.setdefault(m.case, {})[m.configuration] = round(m.instructions_per_second)
+    return rv
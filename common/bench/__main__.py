@@ -0,0 +1,55 @@
+import argparse
+import json
+import sys
+
+from common.bench import as_baseline, baseline_filename, compare, configurations, measure
+from common.bench.corpus import corpus
+
+# python -m common.bench [--case NAME] [--config NAME] [--output results.json] [--update-baseline]
+parser = argparse.ArgumentParser(description='Run the Intcode corpus in every configuration')
+parser.add_argument('--case', action='append', help='only these cases')
+parser.add_argument('--config', action='append', choices=list(configurations), help='only these configurations')
+parser.add_argument('--repeat', type=int, default=3, help='runs per measure, the best one is kept')
+parser.add_argument('--threshold', type=float, default=0.25, help='slowdown against the baseline that fails')
+parser.add_argument('--baseline', default=baseline_filename)
+parser.add_argument('--output', help='write the measures to this JSON file instead of stdout')
+parser.add_argument('--update-baseline', action='store_true', help='save the measures as the new baseline')
+args = parser.parse_args()
+
+cases = [case for case in corpus() if args.case is None or case.name in args.case]
+measures = measure(cases, args.config, repeat=args.repeat)
+report = [{k: v for k, v in m._asdict().items() if k != 'outputs'} for m in measures]
+
+if args.update_baseline:
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    for case, values in as_baseline(measures).items():
+        baseline.setdefault(case, {}).update(values)
+    with open(args.baseline, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+    regressions = []
+else:
+    with open(args.baseline) as f:
+        regressions = compare(measures, json.load(f), args.threshold)
+
+result = {
+    'measures': report,
+    'regressions': [
+        {'case': case, 'configuration': name, 'instructions_per_second': ips, 'baseline': expected}
+        for case, name, ips, expected in regressions
+    ],
+}
+if args.output:
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+else:
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+for case, name, ips, expected in regressions:
+    print(f'REGRESSION {case} [{name}]: {ips:.0f} instructions/s, baseline {expected:.0f}', file=sys.stderr)
+sys.exit(1 if regressions else 0)
@@ -0,0 +1,90 @@
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from common.intcode import Program
+
+_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Case(NamedTuple):
+    name: str
+    image: List[int]
+    inputs: Sequence[int] = ()
+    patches: Optional[Dict[int, int]] = None
+    memory: int = 0  # cells used past the image, list memories are padded with them
+
+
+def _day(day: int, **kwargs) -> Case:
+    filename = os.path.join(_root, f'day_{day:02}', 'input.txt')
+    return Case(f'day_{day:02}', Program.load_memory_from_file(filename), **kwargs)
+
+
+def tight_loop(n: int) -> Case:
+    """Counts to ``n`` then outputs it"""
+    return Case(
+        'tight_loop',
+        [
+            1001, 14, 1, 14,  # *14 += 1
+            1007, 14, n, 15,  # *15 = *14 < n
+            1005, 15, 0,  # if *15 goto 0
+            4, 14,
+            99,
+            0, 0,
+        ],
+    )
+
+
+def recursion(n: int) -> Case:
+    """Outputs 1 + 2 + ... + n summed recursively, each call is a frame of 3 cells on the relative base"""
+    ret, f, ret2, base, stack = 13, 16, 32, 41, 48
+    return Case(
+        'recursion',
+        [
+            109, stack,  # rb = stack
+            21101, n, 0, 1,  # frame: n
+            21101, ret, 0, 0,  # frame: return address
+            1105, 1, f,  # sum(n)
+            204, 2,  # ret: output the result
+            99,
+            # f: result = n ? n + sum(n - 1) : 0
+            1206, 1, base,  # if not n goto base
+            21201, 1, -1, 4,  # next frame: n - 1
+            21101, ret2, 0, 3,  # next frame: return address
+            109, 3,  # rb += 3
+            1105, 1, f,
+            109, -3,  # ret2: rb -= 3
+            22201, 1, 5, 2,  # result = n + result of the next frame
+            2105, 1, 0,  # return
+            21101, 0, 0, 2,  # base: result = 0
+            2105, 1, 0,  # return
+        ],
+        memory=3 * (n + 1),
+    )
+
+
+def echo(n: int) -> Case:
+    """Outputs each input until it reads 0"""
+    return Case(
+        'echo',
+        [
+            3, 11,  # input in *11
+            1006, 11, 10,  # if not *11 goto 10
+            4, 11,  # output *11
+            1105, 1, 0,
+            99,
+            0,
+        ],
+        inputs=list(range(1, n + 1)) + [0],
+    )
+
+
+def corpus() -> List[Case]:
+    return [
+        _day(2, patches={1: 12, 2: 2}),
+        _day(5, inputs=[5]),
+        _day(7, inputs=[0, 0]),
+        _day(9, inputs=[2], memory=1024),
+        tight_loop(30000),
+        recursion(5000),
+        echo(20000),
+    ]
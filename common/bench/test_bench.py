@@ -0,0 +1,32 @@
+from common.bench import Measure, as_baseline, compare, configurations, instructions, measure, program
+from common.bench.corpus import corpus, echo, recursion, tight_loop
+
+
+def test_corpus():
+    for case, outputs in ((tight_loop(10), [10]), (recursion(100), [5050]), (echo(3), [1, 2, 3])):
+        for name in configurations:
+            prog = program(case, name)
+            prog.run()
+            assert prog.outputs == outputs, f'{case.name} [{name}]'
+    assert instructions(tight_loop(10)) == 3 * 10 + 2
+    assert [case.name for case in corpus()][:4] == ['day_02', 'day_05', 'day_07', 'day_09']
+
+
+def test_measure():
+    measures = measure([tight_loop(100), echo(10)], ['list', 'compiled'], repeat=1, min_seconds=0)
+    assert [(m.case, m.configuration) for m in measures] == [
+        ('tight_loop', 'list'), ('tight_loop', 'compiled'), ('echo', 'list'), ('echo', 'compiled'),
+    ]
+    assert all(m.instructions_per_second > 0 and m.peak_rss_kb > 0 for m in measures)
+    assert measures[2].outputs == list(range(1, 11))
+
+
+def test_compare():
+    measures = [
+        Measure('loop', 'list', 1000, 1.0, 1000.0, 0, 0, []),
+        Measure('loop', 'compiled', 1000, 1.0, 1000.0, 0, 0, []),
+        Measure('echo', 'list', 1000, 1.0, 1000.0, 0, 0, []),
+    ]
+    baseline = {'loop': {'list': 1100, 'compiled': 2000}}
+    assert compare(measures, baseline, threshold=0.25) == [('loop', 'compiled', 1000.0, 2000)]
+    assert as_baseline(measures) == {'loop': {'list': 1000, 'compiled': 1000}, 'echo': {'list': 1000}}
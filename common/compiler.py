@@ -0,0 +1,178 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from common.intcode import BaseParserError, MemoryFault, OpCode, OpMode, Program
+
+# Instructions that only touch memory and the base pointer, they are inlined in a block
+_straight_line = {
+    OpCode.ADD: '{} + {}',
+    OpCode.MULT: '{} * {}',
+    OpCode.LT: '1 if {} < {} else 0',
+    OpCode.EQ: '1 if {} == {} else 0',
+}
+
+# Jumps end a block, the block returns the next pointer
+_jumps = {
+    OpCode.JMP_TRUE: '!=',
+    OpCode.JMP_FALSE: '==',
+}
+
+_not_compiled = False
+
+# Generated source -> code object, shared between programs running the same image
+_code_cache = {}  # type: Dict[str, Any]
+
+
+class BlockCompiler:
+    """
+    Execution engine compiling basic blocks of Intcode into Python functions.
+
+    A block starts at the address being executed and runs until a jump (included in the block), an input, an
+    output or an end (left to the interpreter). Each block is generated as Python source and compiled with
+    ``compile()`` so the whole block runs in one call.
+    Blocks are dropped when one of their cells is written, the write ends the running block early so the rest of
+    it is decoded again.
+    """
+
+    def __init__(self, program: Program):
+        self.program = program
+        self._blocks = {}  # type: Dict[int, Union[Callable, bool]]
+        self._cell_blocks = {}  # type: Dict[int, List[int]]
+
+    def flush(self):
+        self._blocks = {}
+        self._cell_blocks = {}
+
+    def fork(self, program: Program) -> "BlockCompiler":
+        rv = self.__class__(program)
+        rv._blocks = dict(self._blocks)
+        rv._cell_blocks = {
+            cell: list(starts)
+            for cell, starts in self._cell_blocks.items()
+        }
+        return rv
+
+    def invalidate(self, address: int):
+        for start in self._cell_blocks.pop(address, ()):
+            self._blocks.pop(start, None)
+
+    @classmethod
+    def _read(cls, mode: OpMode, arg: int) -> str:
+        if mode == OpMode.POSITION:
+            return f'm[{arg}]'
+        elif mode == OpMode.IMMEDIATE:
+            return f'({arg})'
+        return f'm[rb + {arg}]'
+
+    @classmethod
+    def _target(cls, mode: OpMode, arg: int) -> Optional[str]:
+        if mode == OpMode.POSITION:
+            return str(arg)
+        elif mode == OpMode.RELATIVE:
+            return f'rb + {arg}'
+        return None  # immediate output, the interpreter will raise
+
+    @classmethod
+    def _name(cls, pointer: int) -> str:
+        # Negative pointers index list memories from the end like the interpreter does
+        return f'block_{pointer}' if pointer >= 0 else f'block_m{-pointer}'
+
+    @classmethod
+    def _exit(cls, indent: str, pointer: str) -> List[str]:
+        return [
+            f'{indent}prog.data_pointer = rb',
+            f'{indent}return {pointer}',
+        ]
+
+    def _decode_block(self, pointer: int) -> List[Tuple[int, OpCode, Sequence[OpMode], Sequence[int]]]:
+        rv = []
+        while True:
+            try:
+                instruction, op_value, modes, args = self.program.decode(pointer)
+            except (BaseParserError, IndexError):
+                break  # Let the interpreter raise when it gets there
+
+            code = instruction.code
+            if code in _straight_line and self._target(modes[-1], args[-1]) is None:
+                break
+            if code not in _straight_line and code not in _jumps and code != OpCode.ADJ_BASE:
+                break
+
+            rv.append((pointer, code, modes, args))
+            if code in _jumps:
+                break
+            pointer = instruction.next_pointer(pointer)
+        return rv
+
+    def _generate(self, pointer: int, instructions: List[Tuple[int, OpCode, Sequence[OpMode], Sequence[int]]]) -> str:
+        lines = [
+            f'def {self._name(pointer)}(prog, m, cells):',
+            '    rb = prog.data_pointer',
+        ]
+        next_pointer = pointer
+        for address, code, modes, args in instructions:
+            next_pointer = address + 1 + len(args)
+            lines.append(f'    # {address}: {code.name} {" ".join(map(str, args))}')
+            if code in _straight_line:
+                value = _straight_line[code].format(self._read(modes[0], args[0]), self._read(modes[1], args[1]))
+                lines += [
+                    f'    t = {self._target(modes[2], args[2])}',
+                    f'    m[t] = {value}',
+                    '    if t in cells:',
+                    '        prog.invalidate(t)',
+                ]
+                lines += self._exit('        ', str(next_pointer))
+            elif code == OpCode.ADJ_BASE:
+                lines.append(f'    rb += {self._read(modes[0], args[0])}')
+            else:
+                target = self._read(modes[1], args[1])
+                if modes[1] != OpMode.IMMEDIATE:
+                    # Read even when the jump is not taken, a bad address faults as on the interpreter
+                    lines.append(f'    j = {target}')
+                    target = 'j'
+                lines.append(f'    if {self._read(modes[0], args[0])} {_jumps[code]} 0:')
+                lines += self._exit('        ', target)
+
+        lines += self._exit('    ', str(next_pointer))
+        return '\n'.join(lines) + '\n'
+
+    def source(self, pointer: int) -> Optional[str]:
+        """Python source of the block starting at ``pointer``, None if it starts on an interpreted instruction"""
+        instructions = self._decode_block(pointer)
+        if not instructions:
+            return None
+        return self._generate(pointer, instructions)
+
+    def compile(self, pointer: int) -> Union[Callable, bool]:
+        instructions = self._decode_block(pointer)
+        if not instructions:
+            block = _not_compiled
+            end = pointer
+        else:
+            src = self._generate(pointer, instructions)
+            code = _code_cache.get(src)
+            if code is None:
+                code = compile(src, f'<intcode block {pointer}>', 'exec')
+                _code_cache[src] = code
+            scope = {}
+            exec(code, scope)
+            block = scope[self._name(pointer)]
+            address, _, _, args = instructions[-1]
+            end = address + len(args)
+
+        self._blocks[pointer] = block
+        for cell in range(pointer, end + 1):
+            self._cell_blocks.setdefault(cell, []).append(pointer)
+        return block
+
+    def execute(self, pointer: int) -> Optional[int]:
+        block = self._blocks.get(pointer)
+        if block is None:
+            block = self.compile(pointer)
+
+        if block is _not_compiled:
+            return Program.execute(self.program, pointer)
+
+        try:
+            return block(self.program, self.program.memory, self.program._code_cells)
+        except IndexError:
+            raise MemoryFault(f'In block {pointer} - data_pointer={self.program.data_pointer}')
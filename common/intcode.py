@@ -1,6 +1,29 @@
+import asyncio
+import copy
+import hashlib
 import logging
+import mmap
+import os
+import queue
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import deque
+from collections.abc import Sequence as AbcSequence
 from enum import unique, IntEnum
-from typing import List, Optional, Dict, Iterable, Any
+from functools import partial
+from itertools import tee
+from typing import (
+    List, Optional, Dict, Iterable, Iterator, Any, Sequence, Set, Tuple, Union, Deque, Callable, NamedTuple,
+    TYPE_CHECKING,
+)
+
+if TYPE_CHECKING:  # both modules import this one, they are imported lazily at runtime
+    from common.profiler import Profiler
+    from common.trace_file import TraceWriter
 
 
 class BaseParserError(RuntimeError):
@@ -19,6 +42,14 @@ class InputError(BaseParserError):
     pass
 
 
+class BudgetExceeded(BaseParserError):
+    """A run used up its ``max_steps`` or reached its deadline before END"""
+
+
+class Deadlock(RuntimeError):
+    """Every machine of a network still running waits on input nobody can write"""
+
+
 @unique
 class OpCode(IntEnum):
     ADD = 1
@@ -40,9 +71,27 @@ class OpMode(IntEnum):
     RELATIVE = 2  # on the base pointer
 
 
+@unique
+class RunStatus(IntEnum):
+    HALTED = 0  # reached END
+    OUTPUT = 1  # executed an OUTPUT
+    BLOCKED = 2  # waiting on INPUT, the pointer is still on it
+    PREEMPTED = 3  # used up its budget, running again continues from the pointer
+
+
+class TraceRecord(NamedTuple):
+    address: int
+    op_value: int
+    code: OpCode
+    operands: Tuple[int, ...]
+    values: Tuple[int, ...]  # resolved input operands
+    target: Optional[int]  # resolved address written, if any
+
+
 class BaseInstruction:
     code = NotImplemented
     params = 0
+    writes = False  # the last param is an address written to
     _op_code_size = 100
 
     @classmethod
@@ -61,7 +110,7 @@ class BaseInstruction:
     def opcode_from_value(cls, op_value: int) -> OpCode:
         try:
             return OpCode(op_value % cls._op_code_size)  # return lowest 2 digits as OP code
-        except AttributeError:
+        except (AttributeError, ValueError):
             raise InstructionFault(f'Invalid instruction {op_value}')
 
     def next_pointer(self, pointer):
@@ -73,11 +122,11 @@ class BaseInstruction:
                 OpMode((op_value // (self._op_code_size * 10 ** i)) % 10)
                 for i in range(0, self.params)
             ]
-        except AttributeError:
+        except (AttributeError, ValueError):
             raise InstructionFault(f'Invalid OpMode for {op_value}')
 
     @classmethod
-    def get_values(cls, modes: List[OpMode], args: Iterable[int], program: "Program"):
+    def get_values(cls, modes: Sequence[OpMode], args: Iterable[int], program: "Program"):
         rv = []
         for i, a in enumerate(args):
             if modes[i] == OpMode.POSITION:
@@ -91,7 +140,25 @@ class BaseInstruction:
 
         return rv
 
-    def execute(self, op_value: int, program: "Program", *args):
+    def resolve(
+        self, modes: Sequence[OpMode], args: Sequence[int], program: "Program",
+    ) -> Tuple[Tuple[int, ...], Optional[int]]:
+        """Values of the input operands and the address written to, without executing"""
+        if not self.writes:
+            return tuple(self.get_values(modes, args, program)), None
+        values = tuple(self.get_values(modes[:-1], args[:-1], program))
+        if modes[-1] == OpMode.POSITION:
+            return values, args[-1]
+        elif modes[-1] == OpMode.RELATIVE:
+            return values, program.data_pointer + args[-1]
+        return values, None  # immediate, executing it raises
+
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
+        """
+        Execute the instruction at ``pointer``, returns the address of the next one or None to stop.
+
+        Instructions are shared by every machine, all the state is in ``program``.
+        """
         raise NotImplementedError
 
     @classmethod
@@ -121,9 +188,9 @@ class BaseInstruction:
 
 class Base2Inputs1Output(BaseInstruction):
     params = 3
+    writes = True
 
-    def get_elements(self, op_value: int, program: "Program", *args):
-        modes = self.param_modes(op_value)
+    def get_elements(self, op_value: int, modes: Sequence[OpMode], program: "Program", *args):
         a, b = self.get_values(modes[:-1], args[:-1], program)
 
         if modes[-1] == OpMode.IMMEDIATE:
@@ -147,37 +214,36 @@ class Base2Inputs1Output(BaseInstruction):
 class AddInstruction(Base2Inputs1Output):
     code = OpCode.ADD
 
-    def execute(self, op_value: int, program: "Program", *args):
-        a, b, out = self.get_elements(op_value, program, *args)
-        program.memory[out] = a + b
-        return True  # continue
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
+        a, b, out = self.get_elements(op_value, modes, program, *args)
+        program.store(out, a + b)
+        return self.next_pointer(pointer)
 
 
 class MultInstruction(Base2Inputs1Output):
     code = OpCode.MULT
 
-    def execute(self, op_value: int, program: "Program", *args):
-        a, b, out = self.get_elements(op_value, program, *args)
-        program.memory[out] = a * b
-        return True  # continue
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
+        a, b, out = self.get_elements(op_value, modes, program, *args)
+        program.store(out, a * b)
+        return self.next_pointer(pointer)
 
 
 class InputInstruction(BaseInstruction):
     code = OpCode.INPUT
     params = 1  # 1 output
+    writes = True
 
-    def execute(self, op_value: int, program: "Program", *args):
-        modes = self.param_modes(op_value)
-
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
         if modes[0] == OpMode.IMMEDIATE:
             raise InstructionFault(f'Output param of {op_value} cannot be immediate')
         elif modes[0] == OpMode.POSITION:
-            program.memory[args[0]] = program.read()
+            program.store(args[0], program.read())
         elif modes[0] == OpMode.RELATIVE:
-            program.memory[program.data_pointer + args[0]] = program.read()
+            program.store(program.data_pointer + args[0], program.read())
         else:
             raise InstructionFault(f'Unknown mode in {op_value}')
-        return True  # continue
+        return self.next_pointer(pointer)
 
     def as_string(self, op_value: int, program: "Program", *args):
         rv = self.raw_string(op_value, *args)
@@ -188,151 +254,618 @@ class OutputInstruction(BaseInstruction):
     code = OpCode.OUTPUT
     params = 1  # 1 output
 
-    def execute(self, op_value: int, program: "Program", *args):
-        modes = self.param_modes(op_value)
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
         a = self.get_values(modes, args, program)[0]
 
         program.write(a)
-        return True  # continue
+        return self.next_pointer(pointer)
 
 
 class BaseJump(BaseInstruction):
+    params = 2  # 2 inputs
 
-    def __init__(self) -> None:
-        super(BaseJump, self).__init__()
-        self._changed_pointer_to = None
+    def jumps(self, value: int) -> bool:
+        raise NotImplementedError
 
-    def change_pointer(self, pointer: int) -> None:
-        if self._changed_pointer_to is not None:
-            raise InstructionFault('Still executing a previous JMP')
-        self._changed_pointer_to = pointer
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
+        values = self.get_values(modes, args, program)
 
-    def next_pointer(self, pointer: int) -> int:
-        if self._changed_pointer_to is not None:
-            rv = self._changed_pointer_to
-            self._changed_pointer_to = None
-            return rv
-        return super(BaseJump, self).next_pointer(pointer)
+        if self.jumps(values[0]):
+            return values[1]
+        return self.next_pointer(pointer)
 
 
 class JumpIfTrueInstruction(BaseJump):
     code = OpCode.JMP_TRUE
-    params = 2  # 2 inputs
 
-    def execute(self, op_value: int, program: "Program", *args):
-        modes = self.param_modes(op_value)
-        values = self.get_values(modes, args, program)
-
-        if values[0] != 0:
-            self.change_pointer(values[1])
-
-        return True  # continue
+    def jumps(self, value: int) -> bool:
+        return value != 0
 
 
 class JumpIfFalseInstruction(BaseJump):
     code = OpCode.JMP_FALSE
-    params = 2  # 2 inputs
 
-    def execute(self, op_value: int, program: "Program", *args):
-        modes = self.param_modes(op_value)
-        values = self.get_values(modes, args, program)
-
-        if values[0] == 0:
-            self.change_pointer(values[1])
-
-        return True  # continue
+    def jumps(self, value: int) -> bool:
+        return value == 0
 
 
 class LessThanInstruction(Base2Inputs1Output):
     code = OpCode.LT
 
-    def execute(self, op_value: int, program: "Program", *args):
-        a, b, out = self.get_elements(op_value, program, *args)
-        program.memory[out] = int(a < b)
-        return True  # continue
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
+        a, b, out = self.get_elements(op_value, modes, program, *args)
+        program.store(out, int(a < b))
+        return self.next_pointer(pointer)
 
 
 class EqualsInstruction(Base2Inputs1Output):
     code = OpCode.EQ
 
-    def execute(self, op_value: int, program: "Program", *args):
-        a, b, out = self.get_elements(op_value, program, *args)
-        program.memory[out] = int(a == b)
-        return True  # continue
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
+        a, b, out = self.get_elements(op_value, modes, program, *args)
+        program.store(out, int(a == b))
+        return self.next_pointer(pointer)
 
 
 class EndInstruction(BaseInstruction):
     code = OpCode.END
 
-    def execute(self, op_value: int, memory: List[int], *args):
-        return False  # stop
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
+        return None  # stop
 
 
 class AdjustBaseInstruction(BaseInstruction):
     code = OpCode.ADJ_BASE
     params = 1
 
-    def execute(self, op_value: int, program: "Program", *args):
-        modes = self.param_modes(op_value)
+    def execute(self, pointer: int, op_value: int, modes: Sequence[OpMode], program: "Program", *args) -> Optional[int]:
         a = self.get_values(modes, args, program)[0]
 
         program.data_pointer += a
-        return True  # continue
+        return self.next_pointer(pointer)
+
+
+class InputChannel:
+    """Source of the values read by INPUT, raising InputError when there is nothing to read (yet)"""
+
+    def read(self) -> int:
+        raise NotImplementedError
+
+    def rewind(self):
+        """Start reading from the first value again, when the channel can do it"""
+
+    def fork(self) -> "InputChannel":
+        raise NotImplementedError
+
+    def snapshot(self) -> Tuple[List[int], int]:
+        """Values of the channel and how many of them were read, for Program.snapshot()"""
+        raise NotImplementedError
+
+
+class ListInput(InputChannel):
+    """Reads a list with a cursor, the list can keep growing while it is read"""
+
+    def __init__(self, values: List[int], cursor: int = 0):
+        self.values = values
+        self.cursor = cursor
+
+    def read(self) -> int:
+        if self.cursor < len(self.values):
+            rv = self.values[self.cursor]
+            self.cursor += 1
+            return rv
+        raise InputError('No input to read')
+
+    def rewind(self):
+        self.cursor = 0
+
+    def fork(self) -> "ListInput":
+        return ListInput(list(self.values), self.cursor)
+
+    def snapshot(self) -> Tuple[List[int], int]:
+        return list(self.values), self.cursor
+
+
+class DequeInput(InputChannel):
+    """Consumes a deque from the left, values are dropped once read"""
+
+    def __init__(self, values: Deque[int]):
+        self.values = values
+
+    def read(self) -> int:
+        try:
+            return self.values.popleft()
+        except IndexError:
+            raise InputError('No input to read')
+
+    def fork(self) -> "DequeInput":
+        return DequeInput(deque(self.values))
+
+    def snapshot(self) -> Tuple[List[int], int]:
+        return list(self.values), 0
+
+
+class QueueInput(InputChannel):
+    """Consumes a queue.Queue, waiting up to ``timeout`` for a value when ``block`` is set"""
+
+    def __init__(self, values: queue.Queue, block: bool = True, timeout: Optional[float] = None):
+        self.values = values
+        self.block = block
+        self.timeout = timeout
+
+    def read(self) -> int:
+        try:
+            return self.values.get(self.block, self.timeout)
+        except queue.Empty:
+            raise InputError('No input to read')
+
+    def fork(self) -> "DequeInput":
+        """The queue belongs to its producer, the fork gets a copy of the values waiting in it"""
+        with self.values.mutex:
+            return DequeInput(deque(self.values.queue))
+
+    def snapshot(self) -> Tuple[List[int], int]:
+        with self.values.mutex:
+            return list(self.values.queue), 0
+
+
+class IteratorInput(InputChannel):
+    """Pulls values lazily from an iterator"""
+
+    def __init__(self, values: Iterable[int]):
+        self.values = iter(values)
+
+    def read(self) -> int:
+        try:
+            return next(self.values)
+        except StopIteration:
+            raise InputError('No input to read')
+
+    def fork(self) -> "IteratorInput":
+        self.values, values = tee(self.values)
+        return IteratorInput(values)
+
+    def snapshot(self) -> Tuple[List[int], int]:
+        raise TypeError('Iterator inputs may be endless, they cannot be saved')
+
+
+def input_channel(inputs: Union[None, InputChannel, Iterable[int]]) -> InputChannel:
+    if inputs is None:
+        return ListInput([])
+    elif isinstance(inputs, InputChannel):
+        return inputs
+    elif isinstance(inputs, list):
+        return ListInput(inputs)
+    elif isinstance(inputs, deque):
+        return DequeInput(inputs)
+    elif isinstance(inputs, queue.Queue):
+        return QueueInput(inputs)
+    elif isinstance(inputs, AbcSequence):
+        return ListInput(list(inputs))  # tuples, ranges... can be read again on rewind
+    return IteratorInput(inputs)
+
+
+def output_sink(outputs: Any) -> Tuple[Any, Callable[[int], Any]]:
+    """
+    Where OUTPUT sends its values and what is kept in ``Program.outputs``.
+
+    Lists and deques (bounded with ``maxlen``) are appended to and kept, a queue.Queue is put to and any other
+    callable is called with each value. Only lists and deques are kept.
+    """
+    if outputs is None:
+        outputs = []
+    if isinstance(outputs, (list, deque)):
+        return outputs, outputs.append
+    elif isinstance(outputs, queue.Queue):
+        return None, outputs.put
+    elif callable(outputs):
+        return None, outputs
+    raise TypeError(f'Cannot send outputs to {outputs!r}')
+
+
+class CheckpointPolicy:
+    """
+    When Program.run() saves snapshots of the machine, and where.
+
+    A snapshot is saved every ``every_steps`` executions and/or every ``every_seconds``, as
+    ``checkpoint-<number>.ics`` in ``directory``. Files are written under a temporary name then renamed, so a
+    checkpoint is either complete or missing. Only the ``keep`` latest checkpoints are kept.
+    With an engine a step is an execution of the engine, which can run a whole block.
+    """
+    prefix = 'checkpoint-'
+    suffix = '.ics'
+    # Steps between clock checks when only every_seconds is set
+    clock_steps = 10000
+
+    def __init__(
+        self,
+        directory: str,
+        every_steps: Optional[int] = None,
+        every_seconds: Optional[float] = None,
+        keep: int = 3,
+    ):
+        if every_steps is None and every_seconds is None:
+            raise ValueError('Checkpoint every_steps and/or every_seconds')
+        if keep < 1:
+            raise ValueError(f'At least one checkpoint must be kept, not {keep}')
+        self.directory = directory
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.keep = keep
+        self._last_save = time.monotonic()
+
+    @property
+    def interval(self) -> int:
+        """Steps to execute before checking if a checkpoint is due"""
+        if self.every_seconds is None:
+            return self.every_steps
+        elif self.every_steps is None:
+            return self.clock_steps
+        return min(self.every_steps, self.clock_steps)
+
+    def start(self):
+        self._last_save = time.monotonic()
+
+    def due(self, steps: int) -> bool:
+        if self.every_steps is not None and steps >= self.every_steps:
+            return True
+        return self.every_seconds is not None and time.monotonic() - self._last_save >= self.every_seconds
+
+    @classmethod
+    def checkpoints(cls, directory: str) -> List[str]:
+        """Checkpoint files in ``directory``, oldest first"""
+        if not os.path.isdir(directory):
+            return []
+        return [
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.startswith(cls.prefix) and name.endswith(cls.suffix)
+        ]
+
+    @classmethod
+    def latest(cls, directory: str) -> Optional[str]:
+        checkpoints = cls.checkpoints(directory)
+        return checkpoints[-1] if checkpoints else None
+
+    def save(self, program: "Program") -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        latest = self.latest(self.directory)
+        number = int(os.path.basename(latest)[len(self.prefix):-len(self.suffix)]) + 1 if latest else 0
+        filename = os.path.join(self.directory, f'{self.prefix}{number:08d}{self.suffix}')
+
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(program.snapshot())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+
+        for old in self.checkpoints(self.directory)[:-self.keep]:
+            os.remove(old)
+        self._last_save = time.monotonic()
+        return filename
+
+
+# Snapshots are the magic then a zlib stream of the header followed by sections of ints
+_snapshot_magic = b'ICS\x01'
+# memory kind, pointer (-1 once halted), data pointer, input kind, input cursor, output kind, output maxlen (-1)
+_snapshot_header = struct.Struct('<BqqBqBq')
+# encoding (int64 or text when a value does not fit), size in bytes
+_ints_header = struct.Struct('<BQ')
+
+
+def _pack_ints(values: Union[array, memoryview, List[int]]) -> bytes:
+    try:
+        data = values.tobytes() if isinstance(values, (array, memoryview)) else array('q', values).tobytes()
+        encoding = 0
+    except OverflowError:
+        data = ','.join(map(str, values)).encode()
+        encoding = 1
+    return _ints_header.pack(encoding, len(data)) + data
+
+
+def _unpack_ints(body: memoryview, offset: int) -> Tuple[Union[array, List[int]], int]:
+    encoding, size = _ints_header.unpack_from(body, offset)
+    offset += _ints_header.size
+    data = body[offset:offset + size]
+    if encoding == 0:
+        rv = array('q')
+        rv.frombytes(data)
+    else:
+        rv = [int(v) for v in bytes(data).split(b',')] if size else []
+    return rv, offset + size
+
+
+# Binary image cache next to the source file: header then the values as int64, or as text when one does not fit
+_image_cache_suffix = '.icb'
+_image_cache_magic = b'ICB\x01'
+# magic, encoding, source mtime in ns, source size, source sha256, number of values
+_image_cache_header = struct.Struct('<4sBqQ32sQ')
+_image_cache_mtime_offset = struct.calcsize('<4sB')
+# Values of a source image are separated by commas, whitespace around them is ignored, or by line ends
+_separators = re.compile(rb'\s*,\s*|\s+')
+
+
+def _read_image_cache(filename: str) -> Optional[List[int]]:
+    """Image cached for ``filename``, None when there is none or the source changed since"""
+    cache_filename = filename + _image_cache_suffix
+    try:
+        source = os.stat(filename)
+        with open(cache_filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, encoding, mtime, size, digest, count = _image_cache_header.unpack_from(data)
+            if magic != _image_cache_magic or size != source.st_size:
+                return None
+            if mtime != source.st_mtime_ns:
+                with open(filename, 'rb') as src:
+                    if hashlib.sha256(src.read()).digest() != digest:
+                        return None
+            payload = data[_image_cache_header.size:]
+    except (OSError, ValueError, struct.error):
+        return None
+
+    if mtime != source.st_mtime_ns:
+        # Same content with a new mtime (touched, checked out again...), record it so next loads skip the hash
+        try:
+            with open(cache_filename, 'r+b') as f:
+                f.seek(_image_cache_mtime_offset)
+                f.write(struct.pack('<q', source.st_mtime_ns))
+        except OSError:
+            pass
+
+    if encoding == 0:
+        rv = array('q')
+        rv.frombytes(payload)
+        rv = rv.tolist()
+    else:
+        rv = [int(v) for v in payload.split(b',')] if payload else []
+    return rv if len(rv) == count else None
+
+
+def _write_image_cache(filename: str, source: bytes, image: List[int]):
+    try:
+        payload = array('q', image).tobytes()
+        encoding = 0
+    except OverflowError:
+        payload = ','.join(map(str, image)).encode()
+        encoding = 1
+    try:
+        stat = os.stat(filename)
+        header = _image_cache_header.pack(
+            _image_cache_magic, encoding, stat.st_mtime_ns, stat.st_size, hashlib.sha256(source).digest(), len(image),
+        )
+        cache_filename = filename + _image_cache_suffix
+        tmp_filename = f'{cache_filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp_filename, cache_filename)
+    except OSError:
+        pass  # the cache is only an optimisation, read-only directories just parse every time
 
 
 class Program:
 
     class Memory:
+        """
+        Contiguous memory backed by an ``array('q')``.
+
+        The buffer grows geometrically on writes, reads past the end return 0 without allocating. The buffer turns
+        into a list of Python ints the first time a value does not fit on 64 bits.
+        """
         alloc_size = 64
 
         def __init__(self, init_memory: List[int]):
-            self._program = init_memory
-            self._memory = []
+            self._program_size = len(init_memory)
+            try:
+                self._data = array('q', init_memory)
+            except OverflowError:
+                self._data = list(init_memory)
 
         def reset(self):
-            self._memory = []
+            del self._data[self._program_size:]
 
-        def _allocate(self, mem_offset: int):
-            while mem_offset >= len(self._memory):
-                self._memory.extend([0] * self.alloc_size)
+        def _allocate(self, address: int):
+            size = max(address + 1, 2 * len(self._data), self.alloc_size)
+            if isinstance(self._data, array):
+                self._data.frombytes(bytes((size - len(self._data)) * self._data.itemsize))
+            else:
+                self._data.extend([0] * (size - len(self._data)))
+
+        def _set_slow(self, key: int, value: int):
+            if key >= len(self._data):
+                self._allocate(key)
+            try:
+                self._data[key] = value
+            except OverflowError:
+                self._data = self._data.tolist()
+                self._data[key] = value
 
         def __len__(self):
-            return len(self._program) + len(self._memory)
+            return len(self._data)
 
         def __getitem__(self, item: int):
             if item < 0:
                 raise MemoryFault('Cannot access negative memory')
-            if item < len(self._program):
-                return self._program[item]
-            mem_offset = item - len(self._program)
-            # Allocate on access
-            self._allocate(mem_offset)
-            # if mem_offset >= len(self._memory):
-            # raise MemoryFault(f'Failure when accessing {item} (mem_offset={mem_offset} > {len(self._memory)})')
             try:
-                return self._memory[mem_offset]
+                return self._data[item]
             except IndexError:
-                # That should not happen but just in case...
-                raise MemoryFault(f'mem_offset={mem_offset}')
+                return 0  # never written
 
         def __setitem__(self, key: int, value: int):
             if key < 0:
                 raise MemoryFault('Cannot set negative memory')
+            try:
+                self._data[key] = value
+            except (IndexError, OverflowError):
+                self._set_slow(key, value)
+
+        def tolist(self) -> List[int]:
+            return list(self._data)
+
+        def fork(self) -> "Program.Memory":
+            """Copy of the memory, the buffer is contiguous so this is a single copy"""
+            rv = self.__class__.__new__(self.__class__)
+            rv._program_size = self._program_size
+            rv._data = self._data[:]
+            return rv
 
-            if key < len(self._program):
-                self._program[key] = value
-                return
+        def _pack(self) -> bytes:
+            return _pack_ints([self._program_size]) + _pack_ints(self._data)
 
-            mem_offset = key - len(self._program)
-            self._allocate(mem_offset)
-            try:
-                self._memory[mem_offset] = value
-            except IndexError:
-                # That should not happen but just in case...
-                raise MemoryFault(f'mem_offset={mem_offset}')
+        @classmethod
+        def _unpack(cls, body: memoryview, offset: int) -> Tuple["Program.Memory", int]:
+            rv = cls.__new__(cls)
+            (rv._program_size,), offset = _unpack_ints(body, offset)
+            rv._data, offset = _unpack_ints(body, offset)
+            return rv, offset
 
         # TODO(tr) __delitem__?
 
+    class PagedMemory:
+        """
+        Sparse memory made of fixed-size pages created on the first write.
+
+        Reading a page that was never written returns 0 without allocating, so far relative-base or position
+        addresses cost one page instead of everything up to them.
+        Forked memories share their pages until one side writes to them.
+        """
+        page_bits = 10
+        page_size = 1 << page_bits
+        _page_mask = page_size - 1
+
+        def __init__(self, init_memory: List[int]):
+            self._program_size = len(init_memory)
+            self._pages = {}  # type: Dict[int, Any]
+            self._shared = set()  # type: Set[int]
+            for start in range(0, len(init_memory), self.page_size):
+                chunk = list(init_memory[start:start + self.page_size])
+                chunk += [0] * (self.page_size - len(chunk))
+                try:
+                    self._pages[start >> self.page_bits] = array('q', chunk)
+                except OverflowError:
+                    self._pages[start >> self.page_bits] = chunk
+
+        @classmethod
+        def from_buffer(cls, buffer: memoryview, size: int) -> "Program.PagedMemory":
+            """
+            Memory attached to a read-only int64 buffer without copying it, pages are copied on their first write.
+
+            The buffer must be a whole number of pages, ``size`` is the length of the program in it.
+            """
+            rv = cls.__new__(cls)
+            rv._program_size = size
+            rv._pages = {
+                index: buffer[start:start + cls.page_size]
+                for index, start in enumerate(range(0, len(buffer), cls.page_size))
+            }
+            rv._shared = set(rv._pages)
+            return rv
+
+        def _new_page(self, page_index: int):
+            page = array('q', bytes(self.page_size * 8))
+            self._pages[page_index] = page
+            return page
+
+        def _unshare(self, page_index: int):
+            page = self._pages[page_index]
+            if isinstance(page, memoryview):
+                page = array('q', page.tobytes())
+            else:
+                page = page[:]
+            self._pages[page_index] = page
+            self._shared.discard(page_index)
+            return page
+
+        def _set(self, page, page_index: int, offset: int, value: int):
+            try:
+                page[offset] = value
+            except OverflowError:
+                page = page.tolist()
+                self._pages[page_index] = page
+                page[offset] = value
+
+        def reset(self):
+            last_page = (self._program_size - 1) >> self.page_bits if self._program_size else -1
+            self._pages = {
+                index: page
+                for index, page in self._pages.items()
+                if index <= last_page
+            }
+            self._shared &= set(self._pages)
+            if last_page >= 0:
+                page = self._pages[last_page]
+                if last_page in self._shared:
+                    page = self._unshare(last_page)
+                for offset in range(self._program_size & self._page_mask or self.page_size, self.page_size):
+                    page[offset] = 0
+
+        def __len__(self):
+            # Written pages can be anywhere, only the program loaded is dense
+            return self._program_size
+
+        def __getitem__(self, item: int):
+            if item < 0:
+                raise MemoryFault('Cannot access negative memory')
+            page = self._pages.get(item >> self.page_bits)
+            if page is None:
+                return 0  # never written
+            return page[item & self._page_mask]
+
+        def __setitem__(self, key: int, value: int):
+            if key < 0:
+                raise MemoryFault('Cannot set negative memory')
+            page_index = key >> self.page_bits
+            page = self._pages.get(page_index)
+            if page is None:
+                page = self._new_page(page_index)
+            elif page_index in self._shared:
+                page = self._unshare(page_index)
+            self._set(page, page_index, key & self._page_mask, value)
+
+        @property
+        def pages(self) -> int:
+            return len(self._pages)
+
+        def fork(self) -> "Program.PagedMemory":
+            rv = self.__class__.__new__(self.__class__)
+            rv._program_size = self._program_size
+            rv._pages = dict(self._pages)
+            rv._shared = set(self._pages)
+            self._shared = set(self._pages)
+            return rv
+
+        def _pack(self) -> bytes:
+            indices = sorted(self._pages)
+            return b''.join(
+                [_pack_ints([self._program_size] + indices)] +
+                [_pack_ints(self._pages[index]) for index in indices]
+            )
+
+        @classmethod
+        def _unpack(cls, body: memoryview, offset: int) -> Tuple["Program.PagedMemory", int]:
+            rv = cls.__new__(cls)
+            indices, offset = _unpack_ints(body, offset)
+            rv._program_size = indices[0]
+            rv._pages = {}
+            rv._shared = set()
+            for index in indices[1:]:
+                rv._pages[index], offset = _unpack_ints(body, offset)
+            return rv, offset
+
+        def tolist(self) -> List[int]:
+            """Dense copy of the program cells, see iter_pages() for everything written"""
+            rv = []
+            for index in range(0, (self._program_size + self._page_mask) >> self.page_bits):
+                page = self._pages.get(index)
+                rv += [0] * self.page_size if page is None else list(page)
+            del rv[self._program_size:]
+            return rv
+
+        def iter_pages(self) -> Iterator[Tuple[int, Sequence[int]]]:
+            """(first address, values) of the pages allocated, by address"""
+            for index in sorted(self._pages):
+                yield index << self.page_bits, self._pages[index]
+
     @classmethod
     def _add(cls, reg_a: int, reg_b: int):
         return reg_a + reg_b
@@ -346,14 +879,24 @@ class Program:
         return
 
     @classmethod
-    def load_memory_from_file(cls, filename: str) -> List[int]:
-        rv = []
-        with open(filename) as f:
-            rv += [
-                int(entry)
-                for line in f
-                for entry in line.split(',')
-            ]
+    def load_memory_from_file(cls, filename: str, cache: bool = True) -> List[int]:
+        """
+        Parse the comma separated image in ``filename``.
+
+        With ``cache`` the parsed image is also saved next to the file in a binary ``.icb`` companion, which later
+        loads map instead of parsing the text again while the source file is unchanged.
+        """
+        if cache:
+            rv = _read_image_cache(filename)
+            if rv is not None:
+                return rv
+
+        with open(filename, 'rb') as f:
+            source = f.read()
+        entries = source.strip()
+        rv = list(map(int, _separators.split(entries))) if entries else []
+        if cache:
+            _write_image_cache(filename, source, rv)
         return rv
 
     instructions = {
@@ -365,97 +908,489 @@ class Program:
             AdjustBaseInstruction,  # day 09 p1
         )
     }  # type: Dict[int, BaseInstruction]
+    _max_instruction_size = 1 + max(inst.params for inst in instructions.values())
+    # Steps between clock checks when a run has a deadline
+    clock_steps = 1000
 
-    # TODO(tr) make inputs a generator
     def __init__(
         self,
         initial_memory: List[int],
-        inputs: List[int]=None,
-        dynamic_memory=False,
+        inputs: Union[None, InputChannel, Iterable[int]] = None,
+        dynamic_memory: Union[bool, str] = False,
         verbose=False,
+        engine: str = 'interpreter',
+        outputs: Any = None,
     ) -> None:
-        if dynamic_memory:
+        if isinstance(initial_memory, (self.Memory, self.PagedMemory)):
+            self.memory = initial_memory
+        elif dynamic_memory == 'paged':
+            self.memory = self.PagedMemory(initial_memory)
+        elif dynamic_memory:
             self.memory = self.Memory(initial_memory)
         else:
             self.memory = initial_memory
+
+        self._inputs = input_channel(inputs)
+        self.outputs, self._output = output_sink(outputs)
+        self.pointer = 0
+        self.data_pointer = 0
+        # Decoded instructions by address, dropped when one of their cells is written
+        self._decoded = {}  # type: Dict[int, Tuple[BaseInstruction, int, Tuple[OpMode, ...], Tuple[int, ...]]]
+        self._code_cells = set()  # type: Set[int]
+
+        if engine == 'compiled':
+            from common.compiler import BlockCompiler
+            self._engine = BlockCompiler(self)
+        elif engine == 'transpiled':
+            from common.transpiler import TranspiledEngine
+            self._engine = TranspiledEngine(self)
+        elif engine == 'interpreter':
+            self._engine = None
+        else:
+            raise ValueError(f'Unknown engine {engine}')
+
+        self._tracer = None  # type: Optional[Callable[[TraceRecord], Any]]
         if verbose:
             self.log = logging.getLogger(self.__class__.__name__)
+            self.set_tracer(self._log_trace)
         else:
             self.log = None
-
-        if inputs is None:
-            inputs = []
-
-        self._inputs = inputs
-        self._current_input = 0
-        self.outputs = []
-        self.pointer = 0
-        self.data_pointer = 0
+            self._bind_execute()
 
     def reset_pointers(self):
         self.pointer = 0
         self.data_pointer = 0
 
-    def reset_inputs(self, inputs=None):
-        self._current_input = 0
-        if inputs is not None:
-            self._inputs = inputs
+    def reset_inputs(self, inputs: Union[None, InputChannel, Iterable[int]] = None):
+        if inputs is None:
+            self._inputs.rewind()
+        else:
+            self._inputs = input_channel(inputs)
 
     def reset_memory(self):
-        if isinstance(self.memory, self.Memory):
+        if isinstance(self.memory, (self.Memory, self.PagedMemory)):
             self.memory.reset()
+        self.flush_decoded()
+
+    def fork(self) -> "Program":
+        """
+        New machine starting from the current state of this one.
+
+        Pointers, inputs and kept outputs are copied, other output sinks and the tracer are shared. Paged memory is
+        shared copy-on-write with this machine, other memories are copied. Attributes added by subclasses are copied
+        shallowly.
+        """
+        rv = copy.copy(self)
+        if isinstance(self.memory, list):
+            rv.memory = list(self.memory)
+        else:
+            rv.memory = self.memory.fork()
+        rv._inputs = self._inputs.fork()
+        if self.outputs is not None:
+            rv.outputs, rv._output = output_sink(copy.copy(self.outputs))
+        rv._decoded = dict(self._decoded)
+        rv._code_cells = set(self._code_cells)
+        if self._engine is not None:
+            rv._engine = self._engine.fork(rv)
+        if self._tracer == self._log_trace:
+            rv._tracer = rv._log_trace
+        rv._bind_execute()
+        return rv
+
+    def snapshot(self) -> bytes:
+        """
+        Compact copy of the machine state: memory, pointers, inputs and kept outputs.
+
+        Inputs read from an iterator cannot be saved. Other output sinks and attributes added by subclasses are not
+        part of the snapshot.
+        """
+        if isinstance(self.memory, self.PagedMemory):
+            memory_kind = 2
+        elif isinstance(self.memory, self.Memory):
+            memory_kind = 1
+        else:
+            memory_kind = 0
+
+        inputs, cursor = self._inputs.snapshot()
+        input_kind = 0 if isinstance(self._inputs, ListInput) else 1
+
+        maxlen = -1
+        if self.outputs is None:
+            output_kind = 0
+        elif isinstance(self.outputs, deque):
+            output_kind = 2
+            maxlen = self.outputs.maxlen if self.outputs.maxlen is not None else -1
+        else:
+            output_kind = 1
+
+        header = _snapshot_header.pack(
+            memory_kind, self.pointer if self.pointer is not None else -1, self.data_pointer,
+            input_kind, cursor, output_kind, maxlen,
+        )
+        body = b''.join((
+            header,
+            self.memory._pack() if memory_kind else _pack_ints(self.memory),
+            _pack_ints(inputs),
+            _pack_ints(list(self.outputs or ())),
+        ))
+        return _snapshot_magic + zlib.compress(body, 1)
+
+    def restore(self, blob: bytes):
+        """
+        Put the machine back in the state saved by snapshot().
+
+        Saved inputs are read from a list (when they were) or a deque, the output sink is kept when the snapshot has
+        no outputs. The decoded instructions and the engine are flushed.
+        """
+        if blob[:len(_snapshot_magic)] != _snapshot_magic:
+            raise ValueError('Not a Program snapshot')
+        body = memoryview(zlib.decompress(blob[len(_snapshot_magic):]))
+        memory_kind, pointer, data_pointer, input_kind, cursor, output_kind, maxlen = _snapshot_header.unpack_from(
+            body,
+        )
+        offset = _snapshot_header.size
+
+        if memory_kind == 2:
+            self.memory, offset = self.PagedMemory._unpack(body, offset)
+        elif memory_kind == 1:
+            self.memory, offset = self.Memory._unpack(body, offset)
+        else:
+            memory, offset = _unpack_ints(body, offset)
+            self.memory = memory.tolist() if isinstance(memory, array) else memory
+        self.pointer = pointer if pointer >= 0 else None
+        self.data_pointer = data_pointer
+
+        inputs, offset = _unpack_ints(body, offset)
+        if input_kind == 0:
+            self.reset_inputs(ListInput(list(inputs), cursor))
+        else:
+            self.reset_inputs(DequeInput(deque(inputs)))
+
+        outputs, offset = _unpack_ints(body, offset)
+        if output_kind == 1:
+            self.reset_outputs(list(outputs))
+        elif output_kind == 2:
+            self.reset_outputs(deque(outputs, maxlen if maxlen >= 0 else None))
+
+        self.flush_decoded()
+
+    def image(self) -> List[int]:
+        """Copy of the current memory content, only the program cells for a paged memory"""
+        if isinstance(self.memory, (self.Memory, self.PagedMemory)):
+            return self.memory.tolist()
+        return list(self.memory)
 
     def read(self):
-        if self._current_input < len(self._inputs):
-            rv = self._inputs[self._current_input]
-            self._current_input += 1
-            return rv
-        raise InputError('No input to read')
+        return self._inputs.read()
+
+    def pending_inputs(self) -> List[int]:
+        """Values of the inputs not read yet, iterator inputs may be endless and raise TypeError"""
+        values, cursor = self._inputs.snapshot()
+        return values[cursor:]
+
+    def reset_outputs(self, outputs: Any = None):
+        self.outputs, self._output = output_sink(outputs)
 
     def write(self, value: int):
-        self.outputs.append(value)
+        self._output(value)
 
     def log_debug(self, *args, **kwargs):
         if self.log:
             self.log.debug(*args, **kwargs)
 
+    def _bind_execute(self):
+        if self._tracer is not None:
+            self.execute = self._traced_execute
+        elif self._engine is not None:
+            self.execute = self._engine.execute
+        else:
+            self.__dict__.pop('execute', None)
+
+    def set_tracer(self, tracer: Optional[Callable[[TraceRecord], Any]]):
+        """
+        Call ``tracer`` with a TraceRecord before each instruction is executed, None stops tracing.
+
+        Nothing is traced or formatted when there is no tracer. Traced machines run every instruction on the
+        interpreter, the engine takes over again when tracing stops.
+        """
+        self._tracer = tracer
+        self._bind_execute()
+
+    def profile(self, region_bits: int = 8) -> "Profiler":
+        """Start counting where this machine spends its instructions, the profiler is its tracer"""
+        from common.profiler import Profiler
+        profiler = Profiler(self, region_bits)
+        self.set_tracer(profiler)
+        return profiler
+
+    def record_trace(self, filename: str) -> "TraceWriter":
+        """Start writing a binary trace of this machine to ``filename``, until the writer is closed"""
+        from common.trace_file import TraceWriter
+        writer = TraceWriter(self, filename)
+        self.set_tracer(writer)
+        return writer
+
+    def _log_trace(self, record: TraceRecord):
+        instruction = self.instructions[record.code]
+        self.log.debug(f'{record.address}: {instruction.as_string(record.op_value, self, *record.operands)}')
+
+    def _traced_execute(self, pointer: int) -> Optional[int]:
+        try:
+            instruction, op_value, modes, parameters = self.decode(pointer)
+            values, target = instruction.resolve(modes, parameters, self)
+        except IndexError:
+            pass  # execute() raises the fault
+        else:
+            self._tracer(TraceRecord(pointer, op_value, instruction.code, parameters, values, target))
+        return Program.execute(self, pointer)
+
     @property
     def return_code(self) -> Optional[int]:
         if self.memory:
             return self.memory[0]
 
-    def execute(self, pointer: int) -> Optional[int]:
-        op_value = None
-        parameters = []
-        try:
-            op_value = self.memory[pointer]
-            op = BaseInstruction.opcode_from_value(op_value)
+    def decode(self, pointer: int) -> Tuple[BaseInstruction, int, Tuple[OpMode, ...], Tuple[int, ...]]:
+        """Decode the instruction at ``pointer``, reusing the cached entry when there is one."""
+        entry = self._decoded.get(pointer)
+        if entry is not None:
+            return entry
 
-            if op not in self.instructions:
-                raise InstructionFault(f'OP {op_value} is not supported - pointer={pointer}')
+        op_value = self.memory[pointer]
+        op = BaseInstruction.opcode_from_value(op_value)
 
-            instruction = self.instructions[op]
+        if op not in self.instructions:
+            raise InstructionFault(f'OP {op_value} is not supported - pointer={pointer}')
 
-            parameters = []
-            for i in range(0, instruction.params):
-                parameters.append(self.memory[pointer + 1 + i])
+        instruction = self.instructions[op]
+        modes = tuple(instruction.param_modes(op_value))
+        parameters = tuple(
+            self.memory[pointer + 1 + i]
+            for i in range(0, instruction.params)
+        )
 
-            self.log_debug(f'{pointer}: {instruction.as_string(op_value, self, *parameters)}')
-            cont = instruction.execute(op_value, self, *parameters)
+        entry = (instruction, op_value, modes, parameters)
+        self._decoded[pointer] = entry
+        self._code_cells.update(range(pointer, pointer + 1 + instruction.params))
+        return entry
+
+    def invalidate(self, address: int):
+        """Drop the decoded instructions that cover ``address``."""
+        for start in range(address - self._max_instruction_size + 1, address + 1):
+            entry = self._decoded.get(start)
+            if entry is not None and start + len(entry[3]) >= address:
+                del self._decoded[start]
+        self._code_cells.discard(address)
+        if self._engine is not None:
+            self._engine.invalidate(address)
+
+    def flush_decoded(self):
+        self._decoded = {}
+        self._code_cells = set()
+        if self._engine is not None:
+            self._engine.flush()
+
+    def store(self, address: int, value: int):
+        self.memory[address] = value
+        if address in self._code_cells:
+            self.invalidate(address)
 
-            if not cont:
-                return None
+    def execute(self, pointer: int) -> Optional[int]:
+        op_value = None
+        parameters = []
+        try:
+            instruction, op_value, modes, parameters = self.decode(pointer)
+            return instruction.execute(pointer, op_value, modes, self, *parameters)
         except IndexError:
             raise MemoryFault(
                 f'On {op_value} PARAM={",".join(map(str, parameters))} - '
                 f'pointer={pointer} data_pointer={self.data_pointer}'
             )
 
-        return instruction.next_pointer(pointer)
+    def resume(self, path: str) -> bool:
+        """Restore the checkpoint ``path``, or the latest one when it is a directory, False if there is none"""
+        if not os.path.isfile(path):
+            path = CheckpointPolicy.latest(path)
+            if path is None:
+                return False
+        with open(path, 'rb') as f:
+            self.restore(f.read())
+        return True
+
+    def _run_steps(self, steps: int) -> int:
+        """Execute up to ``steps`` times from the current pointer, returns how many executions were done"""
+        done = 0
+        while self.pointer is not None and done < steps:
+            self.pointer = self.execute(self.pointer)
+            done += 1
+        return done
+
+    def _budget(self, used: int, max_steps: Optional[int], deadline: Optional[float]) -> int:
+        """Steps a run having done ``used`` can execute before looking at its budget again, 0 once it is used up"""
+        if deadline is not None and time.monotonic() >= deadline:
+            return 0
+        rv = sys.maxsize if max_steps is None else max(max_steps - used, 0)
+        if deadline is not None:
+            rv = min(rv, self.clock_steps)
+        return rv
 
-    def run(self, *args, **kwargs) -> Any:
-        self.reset_inputs()
-        self.reset_pointers()
-        self.reset_memory()
+    def run(
+        self,
+        *args,
+        checkpoint: Optional[CheckpointPolicy] = None,
+        resume_from: Optional[str] = None,
+        max_steps: Optional[int] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Run from the start until END.
+
+        With ``resume_from`` the run continues from that checkpoint (or the latest one in that directory) when there
+        is one. With ``checkpoint`` snapshots are saved as the policy says while running. See continue_run() for
+        ``max_steps`` and ``deadline``.
+        """
+        if resume_from is None or not self.resume(resume_from):
+            self.reset_inputs()
+            self.reset_pointers()
+            self.reset_memory()
+        return self.continue_run(max_steps, deadline, checkpoint)
+
+    def continue_run(
+        self,
+        max_steps: Optional[int] = None,
+        deadline: Optional[float] = None,
+        checkpoint: Optional[CheckpointPolicy] = None,
+    ) -> RunStatus:
+        """
+        Run from the current pointer until END, or PREEMPTED after ``max_steps`` steps or once ``time.monotonic()``
+        reaches ``deadline``. Running again continues where the run was preempted.
+
+        The deadline is checked every ``clock_steps`` steps. With an engine a step is an execution of the engine,
+        which can run a whole block or a bounded number of transpiled jumps. A preempted run saves a checkpoint when
+        it has a policy.
+        """
+        if checkpoint is None and max_steps is None and deadline is None:
+            while self.pointer is not None:
+                self.pointer = self.execute(self.pointer)
+            return RunStatus.HALTED
+
+        if checkpoint is not None:
+            checkpoint.start()
+        used = 0
+        steps = 0  # since the last checkpoint
         while self.pointer is not None:
-            self.pointer = self.execute(self.pointer)
+            budget = self._budget(used, max_steps, deadline)
+            if not budget:
+                if checkpoint is not None:
+                    checkpoint.save(self)
+                return RunStatus.PREEMPTED
+            if checkpoint is None:
+                used += self._run_steps(budget)
+                continue
+            done = self._run_steps(min(budget, checkpoint.interval))
+            used += done
+            steps += done
+            if self.pointer is not None and checkpoint.due(steps):
+                checkpoint.save(self)
+                steps = 0
+        return RunStatus.HALTED
+
+    def _run_until(
+        self, stop_on_output: bool, max_steps: Optional[int], deadline: Optional[float],
+    ) -> Tuple[RunStatus, List[int]]:
+        produced = []
+        write = self.write
+
+        def capture(value: int):
+            write(value)
+            produced.append(value)
+
+        # Hooked on the instance so subclasses overriding write() are seen too
+        self.write = capture
+        try:
+            used = budget = left = 0
+            while self.pointer is not None:
+                if not left:
+                    used += budget
+                    budget = left = self._budget(used, max_steps, deadline)
+                    if not left:
+                        return RunStatus.PREEMPTED, produced
+                try:
+                    self.pointer = self.execute(self.pointer)
+                except InputError:
+                    return RunStatus.BLOCKED, produced
+                left -= 1
+                if stop_on_output and produced:
+                    return RunStatus.OUTPUT, produced
+            return RunStatus.HALTED, produced
+        finally:
+            del self.write
+
+    def run_until_output(
+        self, max_steps: Optional[int] = None, deadline: Optional[float] = None,
+    ) -> Tuple[RunStatus, List[int]]:
+        """Execute from the current pointer until the next OUTPUT, a blocking INPUT, END or the budget"""
+        return self._run_until(True, max_steps, deadline)
+
+    def run_until_input(
+        self, max_steps: Optional[int] = None, deadline: Optional[float] = None,
+    ) -> Tuple[RunStatus, List[int]]:
+        """
+        Execute from the current pointer until INPUT has nothing to read, END or the budget (as continue_run()),
+        with the values output
+        """
+        return self._run_until(False, max_steps, deadline)
+
+    def run_until_access(self, cells: Iterable[int], max_steps: Optional[int] = None) -> bool:
+        """
+        Execute from the current pointer until the next instruction would use one of ``cells``, as one of its own
+        cells or as an address it reads or writes. False when END was reached first, BudgetExceeded is raised after
+        ``max_steps`` steps.
+
+        What ran before does not depend on those cells, so the machine can be forked there to run variants of them
+        without executing the same prefix again. Instructions are executed one at a time, even with an engine.
+        """
+        cells = set(cells)
+        step = self._traced_execute if self._tracer is not None else partial(Program.execute, self)
+        steps = 0
+        while self.pointer is not None:
+            if steps == max_steps:
+                raise BudgetExceeded(f'No access to {sorted(cells)} in {max_steps} steps - pointer={self.pointer}')
+            pointer = self.pointer
+            try:
+                _, _, modes, parameters = self.decode(pointer)
+            except IndexError:
+                pass  # execute() raises the fault
+            else:
+                if not cells.isdisjoint(range(pointer, pointer + 1 + len(parameters))):
+                    return True
+                for mode, arg in zip(modes, parameters):
+                    if mode == OpMode.RELATIVE:
+                        arg += self.data_pointer
+                    elif mode != OpMode.POSITION:
+                        continue
+                    if arg in cells:
+                        return True
+            self.pointer = step(pointer)
+            steps += 1
+        return False
+
+    async def run_async(self, inputs: asyncio.Queue, outputs: Any):
+        """
+        Run from the current pointer in an event loop, until END.
+
+        Values not read yet from the current inputs are read first, then INPUT awaits ``inputs`` when nothing was
+        received yet. Iterator inputs cannot be carried over and raise TypeError. OUTPUT puts into ``outputs`` when it
+        is an asyncio.Queue or is sent to it like any other output sink. The machine only gives control back to the
+        event loop while it waits for input.
+        """
+        received = deque(self.pending_inputs())
+        self.reset_inputs(received)
+        if isinstance(outputs, asyncio.Queue):
+            outputs = outputs.put_nowait
+        self.reset_outputs(outputs)
+
+        while self.run_until_input()[0] == RunStatus.BLOCKED:
+            received.append(await inputs.get())
+            while not inputs.empty():
+                received.append(inputs.get_nowait())
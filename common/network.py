@@ -0,0 +1,88 @@
+import asyncio
+from typing import Dict, List, Optional, Sequence, Set
+
+from common.intcode import Deadlock, Program
+
+
+class Link(asyncio.Queue):
+    """Input queue of a machine in a network, keeping count of the machines waiting on their link"""
+
+    def __init__(self, network: "Network", index: int):
+        super(Link, self).__init__()
+        self.network = network
+        self.index = index
+
+    async def get(self):
+        if not self.empty():
+            return self.get_nowait()
+
+        self.network.waiting.add(self.index)
+        try:
+            self.network.check_deadlock()
+            return await super(Link, self).get()
+        finally:
+            self.network.waiting.discard(self.index)
+
+
+class Network:
+    """
+    Machines running in one event loop, wired by a topology.
+
+    ``topology`` maps a machine index to the indexes of the machines receiving its outputs. Machines only use the
+    CPU when they have input to process, the run fails with a deadlock when every running machine waits on an empty
+    link.
+    """
+
+    def __init__(
+        self,
+        programs: Sequence[Program],
+        topology: Dict[int, Sequence[int]],
+        initial_inputs: Optional[Dict[int, List[int]]] = None,
+    ):
+        self.programs = programs
+        self.topology = topology
+        self.links = [Link(self, i) for i in range(0, len(programs))]
+        self.outputs = [[] for _ in programs]  # type: List[List[int]]
+        self.running = 0
+        self.waiting = set()  # type: Set[int]
+
+        for i, values in (initial_inputs or {}).items():
+            for v in values:
+                self.links[i].put_nowait(v)
+
+    def check_deadlock(self):
+        if self.running and len(self.waiting) == self.running and all(self.links[i].empty() for i in self.waiting):
+            raise Deadlock('Deadlock')
+
+    def _sink(self, source: int):
+        destinations = [self.links[i] for i in self.topology.get(source, ())]
+        outputs = self.outputs[source]
+
+        def send(value: int):
+            outputs.append(value)
+            for link in destinations:
+                link.put_nowait(value)
+
+        return send
+
+    async def _run_machine(self, i: int):
+        await self.programs[i].run_async(self.links[i], self._sink(i))
+        self.running -= 1
+        self.check_deadlock()
+
+    async def run(self) -> List[List[int]]:
+        """Run every machine until they all reach END, returns what each of them output"""
+        self.running = len(self.programs)
+        await asyncio.gather(*(
+            self._run_machine(i)
+            for i in range(0, len(self.programs))
+        ))
+        return self.outputs
+
+
+def run_network(
+    programs: Sequence[Program],
+    topology: Dict[int, Sequence[int]],
+    initial_inputs: Optional[Dict[int, List[int]]] = None,
+) -> List[List[int]]:
+    return asyncio.run(Network(programs, topology, initial_inputs).run())
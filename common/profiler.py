@@ -0,0 +1,130 @@
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+
+from common.intcode import BaseParserError, OpCode, OpMode, Program, TraceRecord
+
+_jumps = (OpCode.JMP_TRUE, OpCode.JMP_FALSE)
+
+
+class Profiler:
+    """
+    Trace sink counting where a program spends its instructions, see Program.profile().
+
+    Counts executions per opcode, per address and per basic block (entered at the start or after a jump), backward
+    jumps taken as loop iterations, and data reads and writes per memory region of ``2 ** region_bits`` cells.
+    """
+
+    def __init__(self, program: Program, region_bits: int = 8):
+        self.program = program
+        self.region_bits = region_bits
+        self.opcodes = Counter()  # type: Counter[OpCode]
+        self.addresses = Counter()  # type: Counter[int]
+        self.blocks = Counter()  # type: Counter[int]
+        self.loops = Counter()  # type: Counter[Tuple[int, int]]
+        self.reads = Counter()  # type: Counter[int]
+        self.writes = Counter()  # type: Counter[int]
+        self.run_times = []  # type: List[float]
+        self._previous = None  # type: Optional[TraceRecord]
+
+    def __call__(self, record: TraceRecord):
+        self.opcodes[record.code] += 1
+        self.addresses[record.address] += 1
+
+        previous = self._previous
+        if previous is None or previous.code in _jumps:
+            self.blocks[record.address] += 1
+            if previous is not None and record.address <= previous.address:
+                self.loops[(record.address, previous.address)] += 1
+        self._previous = record
+
+        modes = self.program.instructions[record.code].param_modes(record.op_value)
+        for mode, arg in zip(modes, record.operands[:len(record.values)]):
+            if mode == OpMode.POSITION:
+                self.reads[arg >> self.region_bits] += 1
+            elif mode == OpMode.RELATIVE:
+                self.reads[(self.program.data_pointer + arg) >> self.region_bits] += 1
+        if record.target is not None:
+            self.writes[record.target >> self.region_bits] += 1
+
+    @property
+    def steps(self) -> int:
+        return sum(self.opcodes.values())
+
+    @contextmanager
+    def timed(self) -> Iterator["Profiler"]:
+        """Add the wall time of the block to the run times"""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.run_times.append(time.perf_counter() - start)
+            self._previous = None
+
+    def run(self, *args, **kwargs) -> Any:
+        """Timed ``program.run()``"""
+        with self.timed():
+            return self.program.run(*args, **kwargs)
+
+    def disassemble(self, address: int) -> str:
+        try:
+            instruction, op_value, _, params = self.program.decode(address)
+        except (BaseParserError, IndexError):
+            return '<not an instruction>'
+        return instruction.as_string(op_value, self.program, *params)
+
+    def hot_loops(self, top: int = 10) -> List[Tuple[int, int, int, int]]:
+        """(head, tail, iterations, instructions executed between head and tail) by instructions, hottest first"""
+        rv = [
+            (head, tail, iterations, sum(self.addresses[a] for a in self.addresses if head <= a <= tail))
+            for (head, tail), iterations in self.loops.items()
+        ]
+        rv.sort(key=lambda loop: loop[3], reverse=True)
+        return rv[:top]
+
+    def report(self, top: int = 10) -> str:
+        steps = self.steps
+        lines = [f'{steps} instructions in {len(self.run_times)} runs ({sum(self.run_times):.3f}s)']
+
+        lines.append('Opcodes:')
+        for code, count in self.opcodes.most_common():
+            lines.append(f'  {code.name:<10} {count:>12} {100 * count / steps:6.2f}%')
+
+        lines.append(f'Top {top} addresses:')
+        for address, count in self.addresses.most_common(top):
+            lines.append(f'  {address:>6} {count:>12}  {self.disassemble(address)}')
+
+        lines.append(f'Top {top} blocks:')
+        for address, count in self.blocks.most_common(top):
+            lines.append(f'  {address:>6} {count:>12}')
+
+        lines.append(f'Top {top} loops:')
+        for head, tail, iterations, count in self.hot_loops(top):
+            lines.append(f'  {head}-{tail}: {iterations} iterations, {count} instructions')
+            for address in sorted(a for a in self.addresses if head <= a <= tail):
+                lines.append(f'    {address:>6} {self.addresses[address]:>12}  {self.disassemble(address)}')
+
+        region_size = 1 << self.region_bits
+        lines.append(f'Top {top} memory regions ({region_size} cells):')
+        accesses = self.reads + self.writes
+        for region, _ in accesses.most_common(top):
+            start = region * region_size
+            lines.append(
+                f'  {start:>6}-{start + region_size - 1:<6} reads={self.reads[region]} writes={self.writes[region]}'
+            )
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # python -m common.profiler input.txt [inputs...]
+    prog = Program(
+        Program.load_memory_from_file(sys.argv[1]),
+        inputs=list(map(int, sys.argv[2:])),
+        dynamic_memory=True,
+    )
+    profiler = prog.profile()
+    profiler.run()
+    print(f'Outputs: {prog.outputs}')
+    print(profiler.report())
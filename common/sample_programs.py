@@ -0,0 +1,40 @@
+# Small images shared by the tests, copy them before running as programs write to their memory
+
+# Reads 2 values and outputs their sum
+sum_2 = [
+    3, 11,  # input in *11
+    3, 12,  # input in *12
+    1, 11, 12, 13,  # *13 = *11 + *12
+    4, 13,  # output *13
+    99,
+    0, 0, 0,
+]
+
+# Reads 3 values then output their sum
+sum_3 = [
+    3, 20, 3, 21, 3, 22,
+    1, 20, 21, 23,
+    1, 22, 23, 23,
+    4, 23,
+    99,
+] + [0] * 7
+
+# Outputs 0 to 9
+count_to_10 = [
+    4, 20,  # output *20
+    1001, 20, 1, 20,  # *20 += 1
+    1007, 20, 10, 21,  # *21 = *20 < 10
+    1005, 21, 0,  # if *21 goto 0
+    99,
+] + [0] * 8
+
+# Reads a value and outputs it plus one, until it reads 0 which is passed on before stopping
+add_one = [
+    3, 20,  # input in *20
+    1006, 20, 14,  # if *20 == 0 goto 14
+    1001, 20, 1, 20,  # *20 += 1
+    4, 20,  # output *20
+    1105, 1, 0,  # goto 0
+    104, 0,  # output 0
+    99,
+] + [0] * 4
@@ -0,0 +1,130 @@
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Set
+
+from common.intcode import Deadlock, DequeInput, Program, RunStatus
+
+
+class Channel(DequeInput):
+    """Input of a machine in a Scheduler, writing to it wakes the machine when it is parked on it"""
+
+    def __init__(self, scheduler: "Scheduler", index: int, values: Iterable[int] = ()):
+        super(Channel, self).__init__(deque(values))
+        self.scheduler = scheduler
+        self.index = index
+
+    def write(self, value: int):
+        self.values.append(value)
+        self.scheduler.wake(self.index)
+
+
+class Scheduler:
+    """
+    Machines sharing this thread, wired by channels and run in turn.
+
+    A ready machine runs a burst until INPUT has nothing to read, END or ``time_slice`` executions, then goes back at
+    the end of the ready queue if it can still run. A machine waiting on its input is parked, it costs nothing until
+    a value is written to its channel. The network is quiescent when nothing is ready: either every machine halted or
+    the live ones are all parked on empty channels, and only a value sent from outside can wake one of them.
+    """
+
+    def __init__(self, time_slice: int = 1000):
+        if time_slice < 1:
+            raise ValueError(f'A time slice runs at least one execution, got {time_slice}')
+        self.time_slice = time_slice
+        self.programs = []  # type: List[Program]
+        self.channels = []  # type: List[Channel]
+        self.outputs = []  # type: List[List[int]]
+        self.bursts = 0
+        self._destinations = []  # type: List[List[Channel]]
+        self._ready = deque()  # type: Deque[int]
+        self._parked = set()  # type: Set[int]
+        self._halted = set()  # type: Set[int]
+
+    def add(self, program: Program, inputs: Iterable[int] = ()) -> int:
+        """
+        Schedule ``program`` from its current pointer, returns its index.
+
+        Values not read yet from its current inputs are read first, then ``inputs``. Iterator inputs cannot be
+        carried over and raise TypeError.
+        """
+        index = len(self.programs)
+        channel = Channel(self, index, program.pending_inputs())
+        channel.values.extend(inputs)
+        outputs = []  # type: List[int]
+        destinations = []  # type: List[Channel]
+
+        def send(value: int):
+            outputs.append(value)
+            for destination in destinations:
+                destination.write(value)
+
+        program.reset_inputs(channel)
+        program.reset_outputs(send)
+        self.programs.append(program)
+        self.channels.append(channel)
+        self.outputs.append(outputs)
+        self._destinations.append(destinations)
+        if program.pointer is None:
+            self._halted.add(index)
+        else:
+            self._ready.append(index)
+        return index
+
+    def connect(self, source: int, *destinations: int):
+        """Send what ``source`` outputs to the inputs of ``destinations`` too"""
+        self._destinations[source].extend(self.channels[i] for i in destinations)
+
+    def send(self, index: int, *values: int):
+        """Write ``values`` to the input of machine ``index``"""
+        for value in values:
+            self.channels[index].write(value)
+
+    def wake(self, index: int):
+        if index in self._parked:
+            self._parked.remove(index)
+            self._ready.append(index)
+
+    @property
+    def parked(self) -> List[int]:
+        return sorted(self._parked)
+
+    @property
+    def halted(self) -> bool:
+        return len(self._halted) == len(self.programs)
+
+    def _burst(self, index: int):
+        status, _ = self.programs[index].run_until_input(max_steps=self.time_slice)
+        if status == RunStatus.BLOCKED:
+            self._parked.add(index)  # nothing written to its channel since, it was drained
+        elif status == RunStatus.HALTED:
+            self._halted.add(index)
+        else:
+            self._ready.append(index)
+
+    def run(self) -> RunStatus:
+        """Run the ready machines until the network is quiescent, HALTED when every machine reached END"""
+        while self._ready:
+            self.bursts += 1
+            self._burst(self._ready.popleft())
+        return RunStatus.HALTED if self.halted else RunStatus.BLOCKED
+
+
+def run_scheduled(
+    programs: Sequence[Program],
+    topology: Dict[int, Sequence[int]],
+    initial_inputs: Optional[Dict[int, List[int]]] = None,
+    time_slice: int = 1000,
+) -> List[List[int]]:
+    """
+    Like common.network.run_network(), run every machine until they all reach END and return what each of them output.
+
+    Raises common.intcode.Deadlock when the live machines all wait on input nobody can write.
+    """
+    scheduler = Scheduler(time_slice)
+    for i, program in enumerate(programs):
+        scheduler.add(program, (initial_inputs or {}).get(i, ()))
+    for source, destinations in topology.items():
+        scheduler.connect(source, *destinations)
+    if scheduler.run() == RunStatus.BLOCKED:
+        raise Deadlock(f'Deadlock, machines {", ".join(map(str, scheduler.parked))} wait on input')
+    return scheduler.outputs
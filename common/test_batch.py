@@ -0,0 +1,105 @@
+import pickle
+
+import pytest
+
+from common.batch import BatchJob, SharedImage, map_image, run_batch
+from common.intcode import InstructionFault, MemoryFault, Program
+from common.sample_programs import sum_2
+
+
+def _first(image, job):
+    return image[0] + job
+
+
+def test_map_image():
+    results = dict(map_image(sum_2, _first, range(0, 100), max_workers=2, chunk_size=8))
+    assert results == {i: 3 + i for i in range(0, 100)}
+
+
+def test_map_image_from_file(tmp_path):
+    filename = tmp_path / 'input.txt'
+    filename.write_text(','.join(map(str, sum_2)))
+    assert dict(map_image(str(filename), _first, [1, 2], max_workers=1)) == {0: 4, 1: 5}
+
+
+def test_map_image_stops_early():
+    results = map_image(sum_2, _first, range(0, 10 ** 9), max_workers=1, chunk_size=4)
+    assert next(results) is not None
+    results.close()
+
+
+def test_run_batch():
+    jobs = [BatchJob(inputs=[i, 2 * i]) for i in range(0, 20)]
+    results = sorted(run_batch(sum_2, jobs, max_workers=2, chunk_size=3))
+    assert [r.index for r in results] == list(range(0, 20))
+    assert [r.outputs for r in results] == [[3 * i] for i in range(0, 20)]
+    assert all(r.job == jobs[r.index] for r in results)
+    assert all(r.return_code == 3 and r.error is None for r in results)
+
+
+def test_run_batch_patches_and_errors():
+    jobs = [
+        BatchJob(inputs=[3, 4], patches={6: 11}),  # *13 = *11 + *11
+        BatchJob(inputs=[3, 4], patches={4: 2}),  # multiply
+        BatchJob(inputs=[3, 4], patches={10: 42}),  # bad opcode instead of end
+    ]
+    results = sorted(run_batch(sum_2, jobs, max_workers=1))
+    assert results[0].outputs == [6]
+    assert results[1].outputs == [12]
+    assert results[2].outputs == [7]
+    assert isinstance(results[2].error, InstructionFault)
+    assert results[2].return_code is None
+
+
+def test_shared_image():
+    with SharedImage.create(sum_2) as image:
+        assert len(image) == len(sum_2)
+        assert image[:] == sum_2
+        assert image[4] == 1
+        with pytest.raises(IndexError):
+            image[len(sum_2)]
+
+        memory = image.memory()
+        prog = Program(memory, inputs=[3, 4])
+        prog.run()
+        assert prog.outputs == [7]
+        assert memory[13] == 7
+        assert image[13] == 0  # the page was copied on write
+        assert prog.image()[:len(sum_2)] == sum_2[:11] + [3, 4, 7]
+
+        other = image.memory()
+        assert other[13] == 0
+        del prog, memory, other
+
+
+def test_shared_image_pickle():
+    with SharedImage.create(sum_2) as image:
+        attached = pickle.loads(pickle.dumps(image))
+        assert attached.name == image.name
+        assert not attached.owner
+        assert attached[:] == sum_2
+        attached.close()
+
+
+def test_shared_image_big_value():
+    with pytest.raises(OverflowError):
+        SharedImage.create([1 << 70])
+
+
+def test_run_batch_patch_outside_image():
+    jobs = [BatchJob(inputs=[3, 4], patches={len(sum_2): 1}), BatchJob(inputs=[3, 4], patches={-1: 1})]
+    with SharedImage.create(sum_2) as image:
+        for source in (sum_2, image):
+            results = sorted(run_batch(source, jobs, max_workers=1))
+            assert all(isinstance(r.error, MemoryFault) and r.outputs == [] for r in results)
+
+
+def test_run_batch_shared(tmp_path):
+    filename = tmp_path / 'input.txt'
+    filename.write_text(','.join(map(str, sum_2)))
+    jobs = [
+        BatchJob(inputs=[3, 4]),
+        BatchJob(inputs=[3, 4], patches={4: 2}),
+    ]
+    results = sorted(run_batch(str(filename), jobs, max_workers=2, shared=True))
+    assert [r.outputs for r in results] == [[7], [12]]
@@ -0,0 +1,43 @@
+import pytest
+
+from common.intcode import Program, MemoryFault
+
+
+def test_block_source():
+    prog = Program([1101, 1, 2, 7, 1002, 7, 3, 7, 99], engine='compiled')
+    src = prog._engine.source(0)
+    assert 'm[t] = (1) + (2)' in src
+    assert 'm[t] = m[7] * (3)' in src
+    assert prog._engine.source(8) is None, 'END is left to the interpreter'
+
+
+def test_block_runs_in_one_call():
+    prog = Program([1101, 1, 2, 9, 1002, 9, 3, 9, 99, 0], engine='compiled')
+    assert prog.execute(0) == 8
+    assert prog.memory[9] == 9
+    assert prog.execute(8) is None
+
+
+def test_self_modifying_same_block():
+    prog = Program(
+        [
+            1101, 1102, 0, 4,  # *4 = 1102, the next instruction becomes MULT
+            1101, 3, 4, 12,  # *12 = ADD(3, 4) -> MULT(3, 4)
+            4, 12,
+            99, 0, 0,
+        ],
+        engine='compiled',
+    )
+    prog.run()
+    assert prog.outputs == [12]
+
+
+def test_memory_fault():
+    prog = Program([1101, 1, 1, 10, 99], engine='compiled')
+    with pytest.raises(MemoryFault):
+        prog.run()
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        Program([99], engine='jit')
@@ -1,6 +1,20 @@
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
-from common.intcode import Program, OpCode, OpMode, BaseInstruction, AddInstruction, MultInstruction
+from common import intcode
+from common.intcode import (
+    Program, OpCode, OpMode, BaseInstruction, AddInstruction, MultInstruction, MemoryFault, InputError, ListInput,
+    DequeInput, QueueInput, IteratorInput, RunStatus, TraceRecord, CheckpointPolicy, BudgetExceeded,
+)
+from common.sample_programs import count_to_10, sum_3
 
 
 def test_add_register():
@@ -290,3 +304,708 @@ def test_larger_jumper(input):
     else:
         exp = 1001
     assert prog.outputs == [exp]
+
+
+def test_jumps_in_threads():
+    """Instructions are shared by every Program, machines jumping in other threads must not change where one goes"""
+    image = [
+        3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+        1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+        999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99,
+    ]
+    expected = {7: 999, 8: 1000, 9: 1001}
+
+    def run(value):
+        outputs = []
+        for _ in range(0, 200):
+            prog = Program(list(image), inputs=[value])
+            prog.run()
+            outputs += prog.outputs
+        return outputs
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            values = [7, 8, 9] * 2
+            results = list(pool.map(run, values))
+    finally:
+        sys.setswitchinterval(interval)
+    for value, outputs in zip(values, results):
+        assert outputs == [expected[value]] * 200
+
+
+def test_decode_cache_reused():
+    prog = Program([1101, 1, 1, 5, 99, 0])
+    assert prog.decode(0) is prog.decode(0)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    # Transpiled modules are written there
+    monkeypatch.setenv('INTCODE_CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+_engines = ('interpreter', 'compiled', 'transpiled')
+
+
+@pytest.mark.parametrize('engine', _engines)
+def test_loop(engine, cache_dir):
+    prog = Program(
+        [
+            3, 100,  # input in *100
+            1001, 101, 1, 101,  # *101 += 1
+            1007, 101, 1000, 102,  # *102 = *101 < 1000
+            1005, 102, 2,  # if *102 goto 2
+            4, 101,
+            99,
+        ],
+        inputs=[0],
+        dynamic_memory=True,
+        engine=engine,
+    )
+    prog.run()
+    assert prog.outputs == [1000]
+
+
+@pytest.mark.parametrize('engine', _engines)
+def test_self_modifying_operand(engine, cache_dir):
+    prog = Program(
+        [
+            104, 1,  # output 1 (address 1 is incremented below)
+            1001, 1, 1, 1,  # *1 += 1
+            1007, 1, 3, 16,  # *16 = *1 < 3
+            1005, 16, 0,  # if *16 goto 0
+            99,
+            0, 0, 0,
+        ],
+        engine=engine,
+    )
+    prog.run()
+    assert prog.outputs == [1, 2]
+
+
+@pytest.mark.parametrize('engine', _engines)
+def test_self_modifying_opcode(engine, cache_dir):
+    prog = Program(
+        [
+            1105, 1, 10,  # goto 10
+            1101, 1101, 1, 10,  # *10 = 1102 (ADD becomes MULT)
+            1105, 1, 10,  # goto 10
+            1101, 3, 4, 30,  # *30 = ADD(3, 4) then MULT(3, 4)
+            4, 30,  # output *30
+            1008, 10, 1101, 31,  # *31 = *10 == 1101
+            1005, 31, 3,  # if *31 goto 3
+            99,
+            0, 0, 0, 0, 0, 0, 0, 0,
+        ],
+        engine=engine,
+    )
+    prog.run()
+    assert prog.outputs == [7, 12]
+
+
+@pytest.mark.parametrize('engine', _engines)
+def test_relative_base(engine, cache_dir):
+    prog = Program(
+        [
+            109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99,
+        ],
+        dynamic_memory=True,
+        engine=engine,
+    )
+    prog.run()
+
+    assert prog.outputs == [
+        109, 1,
+        204, -1,
+        1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99,
+    ]
+
+
+@pytest.mark.parametrize('engine', _engines)
+def test_negative_jump_target(engine, cache_dir):
+    # A list memory is indexed from its end, as in Python
+    prog = Program([1105, 1, -5, 1101, 2, 3, 0, 99], engine=engine)
+    prog.run()
+    assert prog.return_code == 5
+
+
+@pytest.mark.parametrize('engine', _engines)
+@pytest.mark.parametrize('dynamic_memory', (False, True))
+def test_jump_target_fault(engine, dynamic_memory, cache_dir):
+    # The jump is not taken but its target is read from outside the memory, every engine faults on it
+    prog = Program(
+        [2106, 13, 35, 1107, 1, 5, 2, 22107, 14, 14, 14, 99, 0, 0, 0, 0, 0, 0, 0, 0],
+        engine=engine,
+        dynamic_memory=dynamic_memory,
+    )
+    if dynamic_memory:
+        prog.memory[2] = -35  # reading past a dynamic memory gives 0, a negative address faults
+    with pytest.raises(MemoryFault):
+        prog.run()
+
+
+def test_dynamic_memory_growth():
+    memory = Program.Memory([1, 2, 3])
+    assert memory[1000] == 0
+    assert len(memory) == 3, 'Reading does not allocate'
+
+    memory[100] = 5
+    assert memory[100] == 5
+    assert len(memory) == 101
+    memory[101] = 6
+    assert len(memory) == 202, 'Grows geometrically'
+
+    memory.reset()
+    assert len(memory) == 3
+    assert memory[100] == 0
+    assert memory.tolist() == [1, 2, 3]
+
+
+def test_dynamic_memory_big_values():
+    memory = Program.Memory([1, 2, 3])
+    memory[1] = 2 ** 70
+    memory[10] = -2 ** 70
+    assert memory[1] == 2 ** 70
+    assert memory[10] == -2 ** 70
+    assert memory[2] == 3
+
+
+def test_dynamic_memory_negative():
+    memory = Program.Memory([1, 2, 3])
+    with pytest.raises(MemoryFault):
+        memory[-1]
+    with pytest.raises(MemoryFault):
+        memory[-1] = 0
+
+
+def test_paged_memory_sparse():
+    memory = Program.PagedMemory([1, 2, 3])
+    assert memory.pages == 1
+    assert memory[10 ** 12] == 0
+    assert memory.pages == 1, 'Reading does not allocate'
+
+    memory[10 ** 12] = 5
+    assert memory[10 ** 12] == 5
+    assert memory.pages == 2
+
+    memory[4] = 2 ** 70
+    assert memory[4] == 2 ** 70
+    assert memory[1] == 2
+
+    memory.reset()
+    assert memory.pages == 1
+    assert memory[10 ** 12] == 0
+    assert memory[4] == 0
+    assert memory.tolist() == [1, 2, 3]
+
+
+def test_paged_memory_far_relative_base():
+    prog = Program(
+        [
+            109, 10 ** 12,  # base += 10^12
+            21101, 7, 8, 5,  # *(base + 5) = 15
+            204, 5,  # output *(base + 5)
+            99,
+        ],
+        dynamic_memory='paged',
+    )
+    prog.run()
+    assert prog.outputs == [15]
+    assert prog.memory.pages == 2
+    assert len(prog.memory) == 9
+    assert prog.image() == [109, 10 ** 12, 21101, 7, 8, 5, 204, 5, 99], 'Far pages are not densified'
+    assert [start for start, _ in prog.memory.iter_pages()] == [0, (10 ** 12 + 5) & ~1023]
+
+
+def test_paged_memory_fork_copy_on_write():
+    parent = Program.PagedMemory([1, 2, 3])
+    parent[5000] = 4
+    child = parent.fork()
+    assert child._pages[0] is parent._pages[0], 'Pages are shared until written'
+
+    child[1] = 20
+    parent[5000] = 40
+    assert child[1] == 20
+    assert parent[1] == 2
+    assert child[5000] == 4
+    assert parent[5000] == 40
+    assert child._pages[0] is not parent._pages[0]
+
+
+@pytest.mark.parametrize('dynamic_memory', (False, True, 'paged'))
+@pytest.mark.parametrize('engine', ('interpreter', 'compiled'))
+def test_fork(dynamic_memory, engine):
+    parent = Program(
+        [
+            3, 20,  # input in *20
+            1001, 20, 1, 20,  # *20 += 1
+            4, 20,  # output *20
+            99,
+        ] + [0] * 12,
+        inputs=[1],
+        dynamic_memory=dynamic_memory,
+        engine=engine,
+    )
+    parent.pointer = parent.execute(parent.pointer)
+
+    child = parent.fork()
+    assert child.pointer == parent.pointer
+    child.memory[20] = 10
+
+    while parent.pointer is not None:
+        parent.pointer = parent.execute(parent.pointer)
+    while child.pointer is not None:
+        child.pointer = child.execute(child.pointer)
+
+    assert parent.outputs == [2]
+    assert child.outputs == [11]
+
+
+@pytest.mark.parametrize('inputs, channel', (
+    ([1, 2, 3], ListInput),
+    (deque([1, 2, 3]), DequeInput),
+    (iter([1, 2, 3]), IteratorInput),
+    ((v for v in (1, 2, 3)), IteratorInput),
+))
+def test_input_channels(inputs, channel):
+    prog = Program(list(sum_3), inputs=inputs)
+    assert isinstance(prog._inputs, channel)
+    prog.run()
+    assert prog.outputs == [6]
+
+
+@pytest.mark.parametrize('inputs', ((5,), range(5, 6)))
+def test_sequence_input_rewinds(inputs):
+    prog = Program([3, 0, 4, 0, 99], inputs=inputs)
+    assert isinstance(prog._inputs, ListInput)
+    prog.run()
+    prog.memory[:] = [3, 0, 4, 0, 99]
+    prog.run()
+    assert prog.outputs == [5, 5]
+    assert Program([], inputs=inputs).snapshot()
+
+
+def test_deque_input_consumed():
+    inputs = deque([1])
+    prog = Program(list(sum_3), inputs=inputs)
+    with pytest.raises(InputError):
+        while prog.pointer is not None:
+            prog.pointer = prog.execute(prog.pointer)
+    assert not inputs, 'Read values are not kept'
+
+    inputs.extend([2, 3])
+    while prog.pointer is not None:
+        prog.pointer = prog.execute(prog.pointer)
+    assert prog.outputs == [6]
+
+
+def test_queue_input_blocks():
+    inputs = queue.Queue()
+    prog = Program(list(sum_3), inputs=inputs)
+    thread = threading.Thread(target=prog.run)
+    thread.start()
+    for value in (1, 2, 3):
+        inputs.put(value)
+    thread.join(timeout=5)
+    assert prog.outputs == [6]
+
+
+def test_queue_input_no_wait():
+    prog = Program(list(sum_3), inputs=QueueInput(queue.Queue(), block=False))
+    with pytest.raises(InputError):
+        prog.run()
+
+
+def test_fork_iterator_input():
+    prog = Program(list(sum_3), inputs=iter([1, 2, 3]))
+    prog.pointer = prog.execute(prog.pointer)
+    child = prog.fork()
+
+    for p in (prog, child):
+        while p.pointer is not None:
+            p.pointer = p.execute(p.pointer)
+        assert p.outputs == [6]
+
+
+def test_run_until_access():
+    prog = Program([
+        109, 10,  # base = 10
+        1101, 1, 2, 20,  # *20 = 3
+        21201, 0, 1, 3,  # *(base + 3) = *(base + 0) + 1
+        99,
+    ] + [0] * 10)
+    assert prog.run_until_access({13}) is True
+    assert prog.pointer == 6, 'Stopped before the write through the base'
+    assert prog.memory[20] == 3
+
+    prog.reset_pointers()
+    assert prog.run_until_access({99}) is False
+    assert prog.pointer is None
+    assert Program([1101, 1, 2, 0, 99]).run_until_access({2}) is True, 'Its own cells are used too'
+
+    prog = Program([1105, 1, 0, 99])
+    with pytest.raises(BudgetExceeded):
+        prog.run_until_access({3}, max_steps=5)
+    assert prog.pointer == 0
+
+
+def test_output_callback():
+    values = []
+    prog = Program(list(count_to_10), outputs=values.append)
+    prog.run()
+    assert values == list(range(0, 10))
+    assert prog.outputs is None, 'Nothing is kept'
+
+
+def test_output_bounded_deque():
+    prog = Program(list(count_to_10), outputs=deque(maxlen=2))
+    prog.run()
+    assert list(prog.outputs) == [8, 9]
+
+
+def test_output_queue():
+    values = queue.Queue()
+    prog = Program(list(count_to_10), outputs=values)
+    prog.run()
+    assert [values.get_nowait() for _ in range(0, 10)] == list(range(0, 10))
+
+
+def test_reset_outputs():
+    prog = Program(list(count_to_10))
+    values = deque()
+    prog.reset_outputs(values)
+    prog.run()
+    assert prog.outputs is values
+    assert list(values) == list(range(0, 10))
+
+
+@pytest.mark.parametrize('engine', ('interpreter', 'compiled'))
+def test_run_until_output(engine):
+    prog = Program(list(count_to_10), engine=engine)
+    for i in range(0, 10):
+        assert prog.run_until_output() == (RunStatus.OUTPUT, [i])
+    assert prog.run_until_output() == (RunStatus.HALTED, [])
+    assert prog.outputs == list(range(0, 10))
+
+
+@pytest.mark.parametrize('engine', ('interpreter', 'compiled'))
+def test_run_until_input(engine):
+    inputs = deque([1])
+    prog = Program(list(sum_3), inputs=inputs, engine=engine)
+    assert prog.run_until_input() == (RunStatus.BLOCKED, [])
+    assert prog.pointer == 2, 'Waiting on the second INPUT'
+
+    inputs.extend([2, 3])
+    assert prog.run_until_input() == (RunStatus.HALTED, [6])
+    assert 'write' not in prog.__dict__
+
+
+def test_run_until_output_subclass_write():
+    class Recorder(Program):
+        def __init__(self, *args, **kwargs):
+            super(Recorder, self).__init__(*args, **kwargs)
+            self.recorded = []
+
+        def write(self, value: int):
+            self.recorded.append(value)
+
+    prog = Recorder(list(count_to_10))
+    assert prog.run_until_output() == (RunStatus.OUTPUT, [0])
+    assert prog.recorded == [0]
+
+
+@pytest.mark.parametrize('engine', _engines)
+def test_run_max_steps(engine, cache_dir):
+    prog = Program(list(count_to_10), engine=engine)
+    assert prog.run(max_steps=10) == RunStatus.PREEMPTED
+    if engine == 'interpreter':
+        assert prog.outputs == [0, 1, 2]
+        assert prog.pointer == 6, 'Preempted after the third ADD'
+    assert prog.continue_run(max_steps=10) == RunStatus.PREEMPTED
+    assert prog.continue_run() == RunStatus.HALTED
+    assert prog.outputs == list(range(0, 10))
+
+    assert prog.run(max_steps=41) == RunStatus.HALTED
+    assert prog.run(max_steps=0) == RunStatus.PREEMPTED
+    assert prog.pointer == 0
+
+
+@pytest.mark.parametrize('engine', _engines)
+def test_run_deadline(engine, cache_dir):
+    prog = Program([1105, 1, 0], engine=engine)  # loops forever
+    assert prog.run(deadline=time.monotonic()) == RunStatus.PREEMPTED
+    assert prog.pointer == 0, 'Nothing executed past the deadline'
+
+    start = time.monotonic()
+    assert prog.continue_run(deadline=start + 0.05) == RunStatus.PREEMPTED
+    assert time.monotonic() - start < 1
+
+    prog = Program(list(count_to_10), engine=engine)
+    assert prog.run(max_steps=10 ** 6, deadline=time.monotonic() + 60) == RunStatus.HALTED
+
+    prog = Program([1105, 1, 0], engine=engine)
+    assert prog.run(max_steps=10) == RunStatus.PREEMPTED
+    assert prog.run_until_input(deadline=time.monotonic() + 0.05) == (RunStatus.PREEMPTED, [])
+
+
+def test_run_until_budget():
+    prog = Program(list(count_to_10))
+    assert prog.run_until_output(max_steps=2) == (RunStatus.OUTPUT, [0])
+    assert prog.run_until_output(max_steps=2) == (RunStatus.PREEMPTED, [])
+    assert prog.run_until_output(max_steps=3) == (RunStatus.OUTPUT, [1])
+    assert prog.run_until_input(deadline=time.monotonic()) == (RunStatus.PREEMPTED, [])
+    assert prog.run_until_input(max_steps=9) == (RunStatus.PREEMPTED, [2, 3])
+    assert prog.run_until_input(deadline=time.monotonic() + 60) == (RunStatus.HALTED, list(range(4, 10)))
+
+    prog = Program(list(sum_3), inputs=[1])
+    assert prog.run_until_input(max_steps=1) == (RunStatus.PREEMPTED, [])
+    assert prog.run_until_input(max_steps=1) == (RunStatus.BLOCKED, []), 'A blocked INPUT is not a step'
+
+
+def test_run_preempted_checkpoint(tmp_path):
+    directory = str(tmp_path / 'checkpoints')
+    prog = Program(list(count_to_10))
+    assert prog.run(max_steps=7, checkpoint=CheckpointPolicy(directory, every_steps=100)) == RunStatus.PREEMPTED
+    assert len(CheckpointPolicy.checkpoints(directory)) == 1
+
+    resumed = Program([])
+    assert resumed.run(resume_from=directory) == RunStatus.HALTED
+    assert resumed.outputs == list(range(0, 10))
+
+
+@pytest.mark.parametrize('engine', ('interpreter', 'compiled'))
+def test_tracer(engine):
+    records = []
+    prog = Program(list(sum_3), inputs=[1, 2, 3], engine=engine)
+    prog.set_tracer(records.append)
+    prog.run()
+    assert prog.outputs == [6]
+    assert [r.address for r in records] == [0, 2, 4, 6, 10, 14, 16]
+    assert records[0] == TraceRecord(0, 3, OpCode.INPUT, (20,), (), 20)
+    assert records[4] == TraceRecord(10, 1, OpCode.ADD, (22, 23, 23), (3, 3), 23)
+    assert records[5] == TraceRecord(14, 4, OpCode.OUTPUT, (23,), (6,), None)
+    assert records[6] == TraceRecord(16, 99, OpCode.END, (), (), None)
+
+    prog.set_tracer(None)
+    records.clear()
+    prog.run()
+    assert records == []
+    assert prog.outputs == [6, 6]
+    if engine == 'interpreter':
+        assert 'execute' not in prog.__dict__
+    else:
+        assert prog.execute == prog._engine.execute
+
+
+def test_tracer_relative_target():
+    records = []
+    prog = Program([109, 10, 21101, 2, 3, -5, 99], dynamic_memory=True)
+    prog.set_tracer(records.append)
+    prog.run()
+    assert records[1] == TraceRecord(2, 21101, OpCode.ADD, (2, 3, -5), (2, 3), 5)
+
+
+def test_tracer_fork():
+    records = []
+    prog = Program(list(count_to_10))
+    prog.set_tracer(records.append)
+    prog.run_until_output()
+    fork = prog.fork()
+    assert fork.execute.__self__ is fork
+    count = len(records)
+    fork.run_until_output()
+    assert fork.outputs == [0, 1]
+    assert prog.outputs == [0]
+    assert prog.pointer == 2
+    assert [r.address for r in records[count:]] == [2, 6, 10, 0], 'The tracer is shared'
+
+
+def test_verbose(caplog):
+    with caplog.at_level(logging.DEBUG):
+        Program(list(sum_3), inputs=[1, 2, 3], verbose=True).run()
+    assert caplog.messages[0] == '0: 3 20 # *20 = INPUT()'
+    assert len(caplog.messages) == 7
+
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG):
+        Program(list(sum_3), inputs=[1, 2, 3]).run()
+    assert caplog.messages == []
+
+
+@pytest.mark.parametrize('dynamic_memory', (False, True, 'paged'))
+@pytest.mark.parametrize('engine', ('interpreter', 'compiled'))
+def test_snapshot_restore(dynamic_memory, engine):
+    prog = Program(list(sum_3), inputs=[1, 2], dynamic_memory=dynamic_memory, engine=engine)
+    assert prog.run_until_input() == (RunStatus.BLOCKED, [])
+    blob = prog.snapshot()
+    assert isinstance(blob, bytes)
+
+    prog.reset_inputs([5])
+    prog.run_until_input()
+    assert prog.outputs == [8]
+
+    other = Program([], engine=engine)
+    for restored in (prog, other):
+        restored.restore(blob)
+        assert type(restored.memory) is type(prog.memory)
+        assert restored.pointer == 4
+        assert restored.outputs == []
+        assert restored.run_until_output() == (RunStatus.BLOCKED, [])
+        restored.reset_inputs([10])
+        assert restored.run_until_output() == (RunStatus.OUTPUT, [13])
+
+
+def test_snapshot_state():
+    outputs = deque(maxlen=2)
+    prog = Program([109, 5, 204, 0, 99, 42], inputs=deque([7, 8]), dynamic_memory=True, outputs=outputs)
+    prog.run()
+    blob = prog.snapshot()
+
+    other = Program([])
+    other.restore(blob)
+    assert other.pointer is None
+    assert other.data_pointer == 5
+    assert other.outputs == deque([42], maxlen=2)
+    assert other.read() == 7
+    assert other.image() == prog.image()
+
+
+def test_snapshot_big_values():
+    for dynamic_memory in (False, True, 'paged'):
+        prog = Program([1102, 1 << 40, 1 << 40, 7, 4, 7, 99, 0], dynamic_memory=dynamic_memory)
+        prog.run()
+        other = Program([])
+        other.restore(prog.snapshot())
+        assert other.memory[7] == 1 << 80
+        assert other.outputs == [1 << 80]
+
+
+def test_snapshot_iterator_input():
+    prog = Program(list(sum_3), inputs=iter([1, 2, 3]))
+    with pytest.raises(TypeError):
+        prog.snapshot()
+
+
+def test_restore_invalid():
+    with pytest.raises(ValueError):
+        Program([]).restore(b'not a snapshot')
+
+
+def test_checkpoint(tmp_path):
+    directory = str(tmp_path / 'checkpoints')
+    policy = CheckpointPolicy(directory, every_steps=5, keep=2)
+    prog = Program(list(count_to_10))
+    prog.run(checkpoint=policy)
+    assert prog.outputs == list(range(0, 10))
+
+    checkpoints = CheckpointPolicy.checkpoints(directory)
+    assert [os.path.basename(c) for c in checkpoints] == ['checkpoint-00000006.ics', 'checkpoint-00000007.ics']
+    assert not [name for name in os.listdir(directory) if name.endswith('.tmp')]
+
+    # The last checkpoint was saved after 40 steps, right before END
+    resumed = Program([])
+    assert resumed.resume(directory)
+    assert resumed.outputs == list(range(0, 10))
+    assert resumed.pointer == 13
+
+    resumed = Program([])
+    resumed.run(resume_from=checkpoints[0])
+    assert resumed.outputs == list(range(0, 10))
+    assert resumed.pointer is None
+
+
+def test_checkpoint_resume_fresh(tmp_path):
+    directory = str(tmp_path / 'checkpoints')
+    prog = Program(list(count_to_10))
+    prog.run(resume_from=directory, checkpoint=CheckpointPolicy(directory, every_seconds=60))
+    assert prog.outputs == list(range(0, 10))
+    assert CheckpointPolicy.checkpoints(directory) == []
+
+
+def test_checkpoint_preempted(tmp_path):
+    directory = str(tmp_path / 'checkpoints')
+
+    class Preempted(Exception):
+        pass
+
+    def preempt(value: int):
+        outputs.append(value)
+        if value == 6:
+            raise Preempted()
+
+    outputs = []
+    prog = Program(list(count_to_10), outputs=preempt)
+    with pytest.raises(Preempted):
+        prog.run(checkpoint=CheckpointPolicy(directory, every_steps=3))
+
+    resumed = Program(list(count_to_10), outputs=outputs)
+    resumed.run(resume_from=directory)
+    assert outputs[:7] == list(range(0, 7))
+    assert outputs[7:] == [6, 7, 8, 9], 'Resumed from the checkpoint right before 6 was output'
+
+
+def test_checkpoint_policy():
+    with pytest.raises(ValueError):
+        CheckpointPolicy('checkpoints')
+    with pytest.raises(ValueError):
+        CheckpointPolicy('checkpoints', every_steps=10, keep=0)
+    policy = CheckpointPolicy('checkpoints', every_steps=10 ** 9, every_seconds=1)
+    assert policy.interval == CheckpointPolicy.clock_steps
+
+
+def test_load_memory_from_file(tmp_path):
+    filename = tmp_path / 'input.txt'
+    filename.write_text('1,0,0,3\n99,-2\n')
+    assert Program.load_memory_from_file(str(filename), cache=False) == [1, 0, 0, 3, 99, -2]
+    assert not (tmp_path / 'input.txt.icb').exists()
+
+    assert Program.load_memory_from_file(str(filename)) == [1, 0, 0, 3, 99, -2]
+    assert (tmp_path / 'input.txt.icb').exists()
+    # The cached image is used while the source does not change
+    (tmp_path / 'input.txt.icb').write_bytes((tmp_path / 'input.txt.icb').read_bytes()[:-8] + bytes(8))
+    assert Program.load_memory_from_file(str(filename)) == [1, 0, 0, 3, 99, 0]
+
+    filename.write_text('1,0,0,3,99,-2,1')
+    assert Program.load_memory_from_file(str(filename)) == [1, 0, 0, 3, 99, -2, 1]
+
+    filename.write_text('1, 0, 0, 3,\n 99 ,-2\n')
+    assert Program.load_memory_from_file(str(filename), cache=False) == [1, 0, 0, 3, 99, -2]
+    filename.write_text('1,,0')
+    with pytest.raises(ValueError):
+        Program.load_memory_from_file(str(filename), cache=False)
+
+
+def test_load_memory_from_file_touched(tmp_path, monkeypatch):
+    filename = tmp_path / 'input.txt'
+    filename.write_text('1,2,3')
+    Program.load_memory_from_file(str(filename))
+    os.utime(str(filename), ns=(0, 0))
+    assert Program.load_memory_from_file(str(filename)) == [1, 2, 3]
+
+    # The new mtime was recorded, the source is not hashed again
+    with monkeypatch.context() as m:
+        m.setattr(intcode.hashlib, 'sha256', None)
+        assert Program.load_memory_from_file(str(filename)) == [1, 2, 3]
+
+    filename.write_text('4,5,6')
+    os.utime(str(filename), ns=(1, 1))
+    assert Program.load_memory_from_file(str(filename)) == [4, 5, 6], 'The source is hashed when its mtime changed'
+
+
+def test_load_memory_from_file_big_values(tmp_path):
+    filename = tmp_path / 'input.txt'
+    filename.write_text(f'1,{1 << 70},-{1 << 65}')
+    for _ in range(0, 2):
+        assert Program.load_memory_from_file(str(filename)) == [1, 1 << 70, -(1 << 65)]
+
+
+def test_load_memory_from_file_bad_cache(tmp_path):
+    filename = tmp_path / 'input.txt'
+    filename.write_text('1,2,3')
+    (tmp_path / 'input.txt.icb').write_bytes(b'garbage')
+    assert Program.load_memory_from_file(str(filename)) == [1, 2, 3]
+    (tmp_path / 'input.txt.icb').write_bytes(b'')
+    assert Program.load_memory_from_file(str(filename)) == [1, 2, 3]
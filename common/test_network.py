@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from common.intcode import Deadlock, Program
+from common.network import Network, run_network
+from common.sample_programs import add_one
+
+
+def test_run_async():
+    async def main():
+        inputs = asyncio.Queue()
+        outputs = asyncio.Queue()
+        task = asyncio.create_task(Program(list(add_one)).run_async(inputs, outputs))
+        for v in (1, 5, 0):
+            inputs.put_nowait(v)
+        await task
+        return [outputs.get_nowait() for _ in range(0, outputs.qsize())]
+
+    assert asyncio.run(main()) == [2, 6, 0]
+
+
+def test_run_async_pending_inputs():
+    async def main():
+        inputs = asyncio.Queue()
+        outputs = []
+        prog = Program(list(add_one), inputs=(1, 2))
+        task = asyncio.create_task(prog.run_async(inputs, outputs))
+        inputs.put_nowait(0)
+        await task
+        return outputs
+
+    assert asyncio.run(main()) == [2, 3, 0]
+
+    with pytest.raises(TypeError):
+        asyncio.run(Program(list(add_one), inputs=iter([1])).run_async(asyncio.Queue(), []))
+
+
+def test_chain():
+    programs = [Program(list(add_one)) for _ in range(0, 3)]
+    outputs = run_network(
+        programs,
+        {0: [1], 1: [2]},
+        {0: [1, 10, 0]},
+    )
+    assert outputs[2] == [4, 13, 0]
+
+
+def test_deadlock():
+    # Two machines waiting on each other
+    programs = [Program(list(add_one)) for _ in range(0, 2)]
+    with pytest.raises(Deadlock):
+        run_network(programs, {0: [1], 1: [0]})
+
+
+def test_waiting_on_halted_machine():
+    programs = [Program([99]), Program(list(add_one))]
+    network = Network(programs, {0: [1]})
+    with pytest.raises(Deadlock):
+        asyncio.run(network.run())
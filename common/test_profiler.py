@@ -0,0 +1,50 @@
+from common.intcode import OpCode, Program
+from common.sample_programs import count_to_10
+
+
+def test_profile():
+    prog = Program(list(count_to_10))
+    profiler = prog.profile()
+    profiler.run()
+    assert prog.outputs == list(range(0, 10))
+
+    assert profiler.steps == 41
+    assert profiler.opcodes[OpCode.OUTPUT] == 10
+    assert profiler.opcodes[OpCode.END] == 1
+    assert profiler.addresses[0] == 10
+    assert profiler.addresses[13] == 1
+    assert profiler.blocks == {0: 10, 13: 1}
+    assert profiler.loops == {(0, 10): 9}
+    assert profiler.hot_loops() == [(0, 10, 9, 40)]
+    assert profiler.reads[0] == 40  # *20 by OUTPUT, ADD and LT then *21 by JMP_TRUE
+    assert profiler.writes[0] == 20
+    assert len(profiler.run_times) == 1
+
+
+def test_profile_regions():
+    prog = Program([109, 300, 21101, 1, 2, 0, 99], dynamic_memory=True)
+    profiler = prog.profile(region_bits=4)
+    profiler.run()
+    assert profiler.writes == {300 >> 4: 1}
+    assert profiler.reads == {}
+
+
+def test_report():
+    prog = Program(list(count_to_10))
+    profiler = prog.profile()
+    profiler.run()
+    prog.memory[:] = count_to_10
+    profiler.run()
+    report = profiler.report(top=2)
+    assert report.startswith('82 instructions in 2 runs')
+    assert '  0-10: 18 iterations, 80 instructions' in report
+    assert '1005 21 0 # JMP_TRUE(*21=0, 0)' in report
+
+
+def test_profile_stop():
+    prog = Program(list(count_to_10), engine='compiled')
+    profiler = prog.profile()
+    prog.run_until_output()
+    prog.set_tracer(None)
+    prog.run()
+    assert profiler.steps == 1
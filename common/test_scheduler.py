@@ -0,0 +1,100 @@
+import pytest
+
+from common.intcode import Deadlock, Program, RunStatus
+from common.sample_programs import add_one, count_to_10
+from common.scheduler import Scheduler, run_scheduled
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    # Transpiled modules are written there
+    monkeypatch.setenv('INTCODE_CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize('engine', ('interpreter', 'compiled', 'transpiled'))
+def test_chain(engine, cache_dir):
+    programs = [Program(list(add_one), engine=engine) for _ in range(0, 3)]
+    outputs = run_scheduled(programs, {0: [1], 1: [2]}, {0: [1, 10, 0]})
+    assert outputs == [[2, 11, 0], [3, 12, 0], [4, 13, 0]]
+
+
+@pytest.mark.parametrize('time_slice', (1, 3, 1000))
+def test_fan_out(time_slice):
+    programs = [Program(list(add_one)) for _ in range(0, 3)]
+    outputs = run_scheduled(programs, {0: [1, 2]}, {0: [1, 0]}, time_slice=time_slice)
+    assert outputs == [[2, 0], [3, 0], [3, 0]]
+
+
+def test_time_slice():
+    programs = [Program(list(count_to_10)) for _ in range(0, 2)]
+    scheduler = Scheduler(time_slice=4)
+    for program in programs:
+        scheduler.add(program)
+    assert scheduler.run() == RunStatus.HALTED
+    assert scheduler.outputs == [list(range(0, 10))] * 2
+    assert scheduler.bursts == 2 * 11  # 4 instructions per loop then END, 41 executions
+
+    with pytest.raises(ValueError):
+        Scheduler(time_slice=0)
+
+
+@pytest.mark.parametrize('engine', ('interpreter', 'compiled', 'transpiled'))
+def test_time_slice_loop(engine, cache_dir):
+    # Counts to 10000 without I/O, the slices still give the other machine its turns
+    loop = [
+        1001, 14, 1, 14,  # *14 += 1
+        1007, 14, 10000, 15,  # *15 = *14 < 10000
+        1005, 15, 0,  # if *15 goto 0
+        4, 14,
+        99,
+        0, 0,
+    ]
+    scheduler = Scheduler(time_slice=1)
+    scheduler.add(Program(loop, engine=engine))
+    scheduler.add(Program(list(count_to_10), engine=engine))
+    assert scheduler.run() == RunStatus.HALTED
+    assert scheduler.outputs == [[10000], list(range(0, 10))]
+    assert scheduler.bursts > 30, 'The loop ran in many bursts'
+
+
+def test_parked_machines_do_not_run():
+    scheduler = Scheduler()
+    scheduler.add(Program(list(add_one)))
+    assert scheduler.run() == RunStatus.BLOCKED
+    assert scheduler.parked == [0]
+    assert scheduler.run() == RunStatus.BLOCKED
+    assert scheduler.bursts == 1
+
+    scheduler.send(0, 4, 5)
+    assert scheduler.run() == RunStatus.BLOCKED
+    assert scheduler.bursts == 2, 'Both values are read in one burst'
+    assert scheduler.outputs == [[5, 6]]
+
+    scheduler.send(0, 0)
+    assert scheduler.run() == RunStatus.HALTED
+    assert scheduler.parked == []
+    assert scheduler.outputs == [[5, 6, 0]]
+
+
+def test_pending_inputs():
+    program = Program(list(add_one), inputs=[1, 2])
+    program.run_until_output()
+    outputs = run_scheduled([program], {}, {0: [3, 0]})
+    assert outputs == [[3, 4, 0]]
+
+    with pytest.raises(TypeError):
+        Scheduler().add(Program(list(add_one), inputs=iter([1])))
+
+
+def test_deadlock():
+    # Two machines waiting on each other
+    programs = [Program(list(add_one)) for _ in range(0, 2)]
+    with pytest.raises(Deadlock, match='machines 0, 1 wait'):
+        run_scheduled(programs, {0: [1], 1: [0]})
+
+
+def test_waiting_on_halted_machine():
+    programs = [Program([99]), Program(list(add_one))]
+    with pytest.raises(Deadlock, match='machines 1 wait'):
+        run_scheduled(programs, {0: [1]})
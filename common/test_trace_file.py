@@ -0,0 +1,125 @@
+import logging
+import os
+from collections import deque
+
+import pytest
+
+from common.intcode import OpCode, Program, RunStatus
+from common.sample_programs import count_to_10, sum_3
+from common.trace_file import TraceReader, TraceWriter
+
+
+def test_record(tmp_path):
+    filename = str(tmp_path / 'trace.ict')
+    prog = Program(list(sum_3), inputs=[1, 2, -3])
+    with prog.record_trace(filename):
+        prog.run()
+    assert prog._tracer is None
+
+    with TraceReader(filename) as reader:
+        events = list(reader)
+        assert [e.address for e in events] == [0, 2, 4, 6, 10, 14, 16]
+        assert [e.code for e in events[:3]] == [OpCode.INPUT] * 3
+        assert [e.written for e in events[:3]] == [1, 2, -3]
+        assert [e.target for e in events[:3]] == [20, 21, 22]
+        assert events[3].values == (1, 2)
+        assert events[3].written == 3
+        assert events[4].written == 0
+        assert events[5].values == (0,)
+        assert events[5].time >= events[2].time
+        assert events[6].code == OpCode.END
+        assert len(reader.io_events()) == 4
+
+
+def test_record_loops(tmp_path):
+    filename = str(tmp_path / 'trace.ict')
+    prog = Program(list(count_to_10))
+    with TraceWriter(prog, filename) as writer:
+        prog.set_tracer(writer)
+        prog.run()
+
+    with TraceReader(filename) as reader:
+        assert reader.instruction_mix() == {
+            OpCode.OUTPUT: 10, OpCode.ADD: 10, OpCode.LT: 10, OpCode.JMP_TRUE: 10, OpCode.END: 1,
+        }
+        assert reader.loops() == {(0, 10): 9}
+        assert [e.values[0] for e in reader.io_events()] == list(range(0, 10))
+        summary = reader.summary()
+        assert summary.startswith('41 instructions')
+        assert '  0-10: 9 iterations' in summary
+        assert '10 I/O events' in summary
+
+
+def test_record_blocked_input(tmp_path):
+    filename = str(tmp_path / 'trace.ict')
+    inputs = deque([1])
+    prog = Program(list(sum_3), inputs=inputs)
+    writer = prog.record_trace(filename)
+    assert prog.run_until_input()[0] == RunStatus.BLOCKED
+    inputs.extend([2, 3])
+    assert prog.run_until_input()[0] == RunStatus.HALTED
+    writer.close()
+
+    with TraceReader(filename) as reader:
+        events = reader.io_events()
+        assert [e.written for e in events[:3]] == [1, 2, 3]
+        assert [e.address for e in events[:3]] == [0, 2, 4]
+        assert events[3].values == (6,)
+
+
+def test_smaller_than_log(tmp_path, caplog):
+    filename = str(tmp_path / 'trace.ict')
+    count_to_1000 = list(count_to_10)
+    count_to_1000[8] = 1000
+    prog = Program(list(count_to_1000))
+    with prog.record_trace(filename):
+        prog.run()
+
+    with caplog.at_level(logging.DEBUG):
+        Program(list(count_to_1000), verbose=True).run()
+    log_size = sum(len(message) + 1 for message in caplog.messages)
+    assert (tmp_path / 'trace.ict').stat().st_size * 10 < log_size
+
+
+def test_not_a_trace(tmp_path):
+    filename = tmp_path / 'trace.ict'
+    filename.write_bytes(b'not a trace')
+    with pytest.raises(ValueError):
+        TraceReader(str(filename))
+
+
+def test_replay_matches_tracer(tmp_path):
+    filename = str(tmp_path / 'trace.ict')
+    memory = Program.load_memory_from_file(
+        os.path.join(os.path.dirname(__file__), '..', 'day_09', 'input.txt'), cache=False,
+    )
+    records = []
+    prog = Program(list(memory), inputs=[1], dynamic_memory=True)
+    prog.set_tracer(records.append)
+    prog.run()
+
+    prog = Program(list(memory), inputs=[1], dynamic_memory=True)
+    with prog.record_trace(filename):
+        prog.run()
+
+    with TraceReader(filename) as reader:
+        events = list(reader)
+    assert [(e.address, e.op_value, e.operands, e.values, e.target) for e in events] == [
+        (r.address, r.op_value, r.operands, r.values, r.target) for r in records
+    ]
+
+
+def test_record_paged_far_pages(tmp_path):
+    filename = str(tmp_path / 'trace.ict')
+    prog = Program([109, 10 ** 12, 21101, 7, 8, 5, 204, 5, 99], dynamic_memory='paged')
+    prog.memory[2 * 10 ** 12] = 42  # allocated before the recording starts
+    with prog.record_trace(filename):
+        prog.run()
+    assert prog.outputs == [15]
+    assert os.path.getsize(filename) < 3 * 1024 * 10, 'Only the allocated pages are written'
+
+    with TraceReader(filename) as reader:
+        events = list(reader)
+    assert [e.code for e in events] == [OpCode.ADJ_BASE, OpCode.ADD, OpCode.OUTPUT, OpCode.END]
+    assert events[1].target == 10 ** 12 + 5
+    assert events[2].values == (15,)
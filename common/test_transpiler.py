@@ -0,0 +1,70 @@
+import os
+from collections import OrderedDict
+
+import pytest
+
+from common import transpiler
+from common.intcode import Program, OpCode
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('INTCODE_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(transpiler, '_modules', OrderedDict())
+    return tmp_path
+
+
+def test_reachable():
+    image = [
+        1105, 1, 7,  # goto 7
+        -1, -1, -1, -1,  # data, never decoded
+        1101, 1, 2, 13,
+        99,
+        0, 0,
+    ]
+    decoded = transpiler.reachable(image)
+    assert sorted(decoded) == [0, 3, 7, 11]
+    assert decoded[7][0] == OpCode.ADD
+
+
+def test_module_cached_on_disk(cache_dir, monkeypatch):
+    image = [1101, 1, 2, 5, 99, 0]
+    module = transpiler.load(image)
+    assert os.path.dirname(module.__file__) == str(cache_dir)
+    assert module.ENTRIES == {0: 4}
+
+    # A new process imports the module instead of transpiling again
+    monkeypatch.setattr(transpiler, '_modules', OrderedDict())
+
+    def fail(image):
+        raise AssertionError('Should not transpile again')
+
+    monkeypatch.setattr(transpiler, 'transpile', fail)
+    assert transpiler.load(image).ENTRIES == {0: 4}
+
+
+def test_patched_image_reuses_module(cache_dir, monkeypatch):
+    image = [1101, 0, 0, 7, 4, 7, 99, 0]
+    prog = Program(list(image), engine='transpiled')
+    prog.run()
+    assert prog.outputs == [0]
+
+    def fail(image):
+        raise AssertionError('Should not transpile again')
+
+    monkeypatch.setattr(transpiler, 'transpile', fail)
+    for noun, verb in ((1, 2), (3, 4)):
+        prog = Program([1101, noun, verb] + image[3:], engine='transpiled')
+        prog.run()
+        assert prog.outputs == [noun + verb]
+        assert prog._engine._dirty == {0}
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_cache_bounded(cache_dir, monkeypatch):
+    monkeypatch.setattr(transpiler, '_max_modules', 2)
+    monkeypatch.setattr(transpiler, '_max_files', 3)
+    for i in range(0, 5):
+        transpiler.load([1101, i, 0, 5, 99, 0])
+    assert len(transpiler._modules) == 2
+    assert len(os.listdir(cache_dir)) == 3
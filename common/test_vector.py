@@ -0,0 +1,103 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from common.batch import BatchJob  # noqa: E402
+from common.intcode import InputError, InstructionFault, MemoryFault, RunStatus  # noqa: E402
+from common.sample_programs import count_to_10, sum_2  # noqa: E402
+from common.vector import ValueOverflow, VectorMachines, run_vectorised  # noqa: E402
+
+
+def test_run_vectorised():
+    jobs = [BatchJob(inputs=[i, 2 * i]) for i in range(0, 20)]
+    results = run_vectorised(sum_2, jobs)
+    assert [r.index for r in results] == list(range(0, 20))
+    assert [r.outputs for r in results] == [[3 * i] for i in range(0, 20)]
+    assert all(r.return_code == 3 and r.error is None for r in results)
+
+
+def test_run_vectorised_patches_and_errors():
+    jobs = [
+        BatchJob(inputs=[3, 4], patches={6: 11}),  # *13 = *11 + *11
+        BatchJob(inputs=[3, 4], patches={4: 2}),  # multiply
+        BatchJob(inputs=[3, 4], patches={10: 42}),  # bad opcode instead of end
+        BatchJob(inputs=[3, 4], patches={7: 100}),  # write out of the memory
+        BatchJob(inputs=[3]),
+    ]
+    results = run_vectorised(sum_2, jobs)
+    assert [r.outputs for r in results] == [[6], [12], [7], [], []]
+    assert isinstance(results[2].error, InstructionFault)
+    assert isinstance(results[3].error, MemoryFault)
+    assert isinstance(results[4].error, InputError)
+    assert [r.return_code for r in results] == [3, 3, None, None, None]
+
+
+def test_divergent_machines():
+    # Each machine loops a different number of times
+    image = [
+        3, 30,  # input the count in *30
+        1001, 31, 1, 31,  # *31 += 1
+        8, 31, 30, 32,  # *32 = *31 == *30
+        1006, 32, 2,  # if not *32 goto 2
+        4, 31,
+        99,
+    ] + [0] * 20
+    machines = VectorMachines(image, [[n] for n in (1, 5, 3)])
+    machines.run()
+    assert machines.outputs == [[1], [5], [3]]
+    assert machines.status.tolist() == [RunStatus.HALTED] * 3
+    assert machines.steps == 1 + 3 * 5 + 2, 'As many steps as the longest machine'
+
+
+def test_patches_and_relative_base():
+    machines = VectorMachines(count_to_10, [[]] * 2, patches=[None, {8: 5}])
+    machines.run()
+    assert machines.outputs == [list(range(0, 10)), list(range(0, 5))]
+
+    machines = VectorMachines([109, 3, 21101, 1, 2, 1, 204, 1, 99], [[]], size=10)
+    machines.run()
+    assert machines.outputs == [[3]]
+    assert machines.memory[0, 4] == 3
+
+
+def test_self_modifying_opcode():
+    image = [
+        1105, 1, 10,  # goto 10
+        1101, 1101, 1, 10,  # *10 = 1102 (ADD becomes MULT)
+        1105, 1, 10,  # goto 10
+        1101, 3, 4, 30,  # *30 = ADD(3, 4) then MULT(3, 4)
+        4, 30,  # output *30
+        1008, 10, 1101, 31,  # *31 = *10 == 1101
+        1005, 31, 3,  # if *31 goto 3
+        99,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ]
+    machines = VectorMachines(image, [[]] * 2, patches=[None, {11: 5}])
+    machines.run()
+    assert machines.outputs == [[7, 12], [9, 20]]
+
+
+def test_overflow():
+    # Squares its input twice then adds it to itself
+    image = [
+        3, 17,  # input in *17
+        2, 17, 17, 17,  # *17 *= *17
+        2, 17, 17, 17,  # *17 *= *17
+        1, 17, 17, 0,  # *0 = *17 + *17
+        4, 0,
+        99,
+        0,
+    ]
+    # 55000 ** 4 fits but not twice it, the others overflow on a MULT
+    machines = VectorMachines(image, [[3], [2 ** 16], [55000], [2 ** 15 - 1], [-(2 ** 16)]])
+    machines.run()
+    assert machines.outputs[0] == [162]
+    assert machines.outputs[3] == [2 * (2 ** 15 - 1) ** 4]
+    for row in (1, 2, 4):
+        assert isinstance(machines.errors[row], ValueOverflow), row
+        assert machines.outputs[row] == []
+
+    results = run_vectorised(image, [BatchJob(inputs=[n]) for n in (3, 2 ** 16, 2 ** 40)])
+    assert [r.outputs for r in results] == [[162], [2 ** 65], [2 ** 161]]
+    assert [r.index for r in results] == [0, 1, 2]
+    assert all(r.error is None for r in results)
@@ -0,0 +1,296 @@
+import mmap
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from common.intcode import BaseInstruction, OpCode, OpMode, Program, TraceRecord
+
+# File layout, every number is a LEB128 varint and signed ones are zigzag encoded:
+#   the magic
+#   the memory when the recording started: a number of chunks, each its first address, its size and its values
+#   (one chunk for dense memories, one per page allocated for paged ones), the pointer and the data pointer
+#   one record per instruction executed:
+#     signed(address - address expected after the previous instruction)
+#     signed(value read) for INPUT
+#     microseconds since the recording started for INPUT and OUTPUT
+# The reader replays the writes on the image, so opcodes, operands and what is read or written follow from the
+# addresses executed and the values read. Memory changed from outside the program while it is recorded is missed.
+MAGIC = b'ICTRACE3'
+
+_flush_size = 1 << 16
+
+
+class TraceEvent(NamedTuple):
+    step: int
+    address: int
+    op_value: int
+    code: OpCode
+    operands: Tuple[int, ...]
+    values: Tuple[int, ...]  # resolved input operands
+    target: Optional[int]  # resolved address written
+    written: Optional[int]  # value stored at target
+    time: Optional[float]  # seconds since the recording started, for INPUT and OUTPUT
+
+
+def _varint(buffer: bytearray, value: int):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _zigzag(buffer: bytearray, value: int):
+    _varint(buffer, value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+
+def _computed(code: OpCode, values: Tuple[int, ...]) -> Optional[int]:
+    if code == OpCode.ADD:
+        return values[0] + values[1]
+    elif code == OpCode.MULT:
+        return values[0] * values[1]
+    elif code == OpCode.LT:
+        return int(values[0] < values[1])
+    elif code == OpCode.EQ:
+        return int(values[0] == values[1])
+    return None
+
+
+class TraceWriter:
+    """
+    Trace sink writing a compact binary trace of ``program`` to ``filename``, see Program.record_trace().
+
+    The image is written when the first instruction is traced, so patches made before running are part of it. An
+    INPUT is written once the next instruction starts, when the value it read is in memory. An INPUT that blocked is
+    executed again later, only that second attempt is recorded.
+    """
+
+    def __init__(self, program: Program, filename: str):
+        self.program = program
+        self.file = open(filename, 'wb')
+        self._buffer = bytearray(MAGIC)
+        self._next_address = None  # type: Optional[int]
+        self._pending = None  # type: Optional[Tuple[TraceRecord, float]]
+        self._start = time.perf_counter()
+
+    def _header(self):
+        memory = self.program.memory
+        if isinstance(memory, Program.PagedMemory):
+            chunks = list(memory.iter_pages())  # far pages are not densified
+        else:
+            chunks = [(0, self.program.image())]
+        _varint(self._buffer, len(chunks))
+        for start, values in chunks:
+            _varint(self._buffer, start)
+            _varint(self._buffer, len(values))
+            for value in values:
+                _zigzag(self._buffer, value)
+        _zigzag(self._buffer, self.program.pointer)
+        _zigzag(self._buffer, self.program.data_pointer)
+        self._next_address = self.program.pointer
+
+    def _encode(self, record: TraceRecord, value: Optional[int], at: Optional[float]):
+        buffer = self._buffer
+        _zigzag(buffer, record.address - self._next_address)
+        self._next_address = record.address + 1 + len(record.operands)
+        if value is not None:
+            _zigzag(buffer, value)
+        if at is not None:
+            _varint(buffer, int((at - self._start) * 1e6))
+        if len(buffer) >= _flush_size:
+            self.file.write(buffer)
+            buffer.clear()
+
+    def _resolve_pending(self, address: Optional[int]):
+        record, at = self._pending
+        self._pending = None
+        if address == record.address:
+            return  # INPUT blocked and is being executed again
+        value = self.program.memory[record.target] if record.target is not None else 0
+        self._encode(record, value, at)
+
+    def __call__(self, record: TraceRecord):
+        if self._next_address is None:
+            self._header()
+        if self._pending is not None:
+            self._resolve_pending(record.address)
+
+        if record.code == OpCode.INPUT:
+            self._pending = (record, time.perf_counter())
+        elif record.code == OpCode.OUTPUT:
+            self._encode(record, None, time.perf_counter())
+        else:
+            self._encode(record, None, None)
+
+    def close(self):
+        """Write what is left and stop tracing the program"""
+        if self.program._tracer is self:
+            self.program.set_tracer(None)
+        if self._next_address is None:
+            self._header()
+        if self._pending is not None:
+            self._resolve_pending(self.program.pointer)
+        self.file.write(self._buffer)
+        self._buffer.clear()
+        self.file.close()
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TraceReader:
+    """Memory-mapped trace written by TraceWriter, the analyses go through the file once without running anything"""
+
+    def __init__(self, filename: str):
+        with open(filename, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            self._data.close()
+            raise ValueError(f'{filename} is not an Intcode trace')
+
+    def close(self):
+        self._data.close()
+
+    def __enter__(self) -> "TraceReader":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self) -> Iterator[TraceEvent]:
+        data = self._data
+        end = len(data)
+        i = len(MAGIC)
+
+        def number() -> int:
+            nonlocal i
+            rv = 0
+            shift = 0
+            while True:
+                byte = data[i]
+                i += 1
+                rv |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    return rv
+                shift += 7
+
+        def signed() -> int:
+            value = number()
+            return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+        memory = {}  # type: Dict[int, int]
+        for _ in range(0, number()):
+            start = number()
+            for address in range(start, start + number()):
+                memory[address] = signed()
+        next_address = signed()
+        data_pointer = signed()
+
+        def resolve(mode: OpMode, arg: int) -> int:
+            if mode == OpMode.POSITION:
+                return arg
+            elif mode == OpMode.RELATIVE:
+                return data_pointer + arg
+            return None
+
+        step = 0
+        while i < end:
+            address = next_address + signed()
+            op_value = memory.get(address, 0)
+            code = BaseInstruction.opcode_from_value(op_value)
+            instruction = Program.instructions[code]
+            modes = instruction.param_modes(op_value)
+            operands = tuple(memory.get(address + 1 + k, 0) for k in range(0, instruction.params))
+            next_address = address + 1 + instruction.params
+
+            read = instruction.params - instruction.writes
+            values = tuple(
+                operands[k] if modes[k] == OpMode.IMMEDIATE else memory.get(resolve(modes[k], operands[k]), 0)
+                for k in range(0, read)
+            )
+            target = resolve(modes[-1], operands[-1]) if instruction.writes else None
+            at = None
+            if code == OpCode.INPUT:
+                written = signed()
+            else:
+                written = _computed(code, values)
+            if code in (OpCode.INPUT, OpCode.OUTPUT):
+                at = number() / 1e6
+
+            if target is not None:
+                memory[target] = written
+            elif code == OpCode.ADJ_BASE:
+                data_pointer += values[0]
+
+            yield TraceEvent(step, address, op_value, code, operands, values, target, written, at)
+            step += 1
+
+    @classmethod
+    def _is_loop(cls, previous: Optional[TraceEvent], event: TraceEvent) -> bool:
+        return (
+            previous is not None and previous.code in (OpCode.JMP_TRUE, OpCode.JMP_FALSE) and
+            event.address <= previous.address
+        )
+
+    def instruction_mix(self) -> Counter:
+        """Executions per opcode"""
+        return Counter(event.code for event in self)
+
+    def loops(self) -> Counter:
+        """Backward jumps taken by (head, tail)"""
+        rv = Counter()
+        previous = None
+        for event in self:
+            if self._is_loop(previous, event):
+                rv[(event.address, previous.address)] += 1
+            previous = event
+        return rv
+
+    def io_events(self) -> List[TraceEvent]:
+        """INPUT and OUTPUT events, INPUT has the value read in ``written`` and OUTPUT the value sent in ``values``"""
+        return [
+            event
+            for event in self
+            if event.time is not None
+        ]
+
+    def summary(self, top: int = 10) -> str:
+        """Instruction mix, hot loops and the longest gaps between I/O events, in one pass"""
+        mix = Counter()
+        loops = Counter()
+        gaps = []
+        previous = previous_io = None
+        for event in self:
+            mix[event.code] += 1
+            if self._is_loop(previous, event):
+                loops[(event.address, previous.address)] += 1
+            if event.time is not None:
+                if previous_io is not None:
+                    gaps.append((event.time - previous_io.time, event.step - previous_io.step, previous_io.step))
+                previous_io = event
+            previous = event
+
+        steps = sum(mix.values())
+        lines = [f'{steps} instructions']
+        for code, count in mix.most_common():
+            lines.append(f'  {code.name:<10} {count:>12} {100 * count / steps:6.2f}%')
+
+        lines.append(f'Top {top} loops:')
+        for (head, tail), count in loops.most_common(top):
+            lines.append(f'  {head}-{tail}: {count} iterations')
+
+        lines.append(f'{len(gaps) + (previous_io is not None)} I/O events')
+        gaps.sort(reverse=True)
+        lines.append(f'Top {top} gaps between I/O:')
+        for seconds, count, step in gaps[:top]:
+            lines.append(f'  after step {step}: {seconds:.6f}s, {count} instructions')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # python -m common.trace_file trace.ict
+    with TraceReader(sys.argv[1]) as reader:
+        print(reader.summary())
@@ -0,0 +1,312 @@
+import hashlib
+import importlib.util
+import os
+import sys
+from collections import OrderedDict
+from types import ModuleType
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from common.intcode import BaseInstruction, BaseParserError, MemoryFault, OpCode, OpMode, Program
+
+# Bump when the generated code changes so stale modules are not imported
+_version = 3
+
+_operators = {
+    OpCode.ADD: '{} + {}',
+    OpCode.MULT: '{} * {}',
+    OpCode.LT: '1 if {} < {} else 0',
+    OpCode.EQ: '1 if {} == {} else 0',
+}
+_jumps = {
+    OpCode.JMP_TRUE: '!=',
+    OpCode.JMP_FALSE: '==',
+}
+_leaf_size = 4
+# Jumps one execution runs before returning, loops give control back to budgets and time slices
+_max_jumps = 256
+
+# Loaded modules and the image they were generated from by image hash, least recently used first
+_modules = OrderedDict()  # type: OrderedDict[str, Tuple[List[int], ModuleType]]
+_max_modules = 16
+# Generated files kept in the cache directory, the oldest ones are removed
+_max_files = 256
+# An image differing from a loaded one in at most this many cells reuses its module, with those cells dirty
+_max_patched = 16
+
+
+def cache_directory() -> str:
+    return os.environ.get('INTCODE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'intcode'))
+
+
+def image_hash(image: Sequence[int]) -> str:
+    h = hashlib.sha256(f'v{_version}:'.encode())
+    h.update(','.join(map(str, image)).encode())
+    return h.hexdigest()
+
+
+def _decode(image: Sequence[int], address: int) -> Optional[Tuple[OpCode, Tuple[OpMode, ...], Tuple[int, ...]]]:
+    try:
+        op_value = image[address]
+        instruction = Program.instructions[BaseInstruction.opcode_from_value(op_value)]
+        modes = tuple(instruction.param_modes(op_value))
+        args = tuple(image[address + 1 + i] for i in range(0, instruction.params))
+    except (BaseParserError, IndexError, KeyError):
+        return None
+    return instruction.code, modes, args
+
+
+def reachable(image: Sequence[int]) -> Dict[int, Tuple[OpCode, Tuple[OpMode, ...], Tuple[int, ...]]]:
+    """
+    Decode the instructions reachable from address 0.
+
+    Jumps with an immediate target are followed, the address after an unconditional jump is also explored because
+    that is where calls usually return to.
+    """
+    rv = {}
+    todo = [0]
+    while todo:
+        address = todo.pop()
+        if address in rv or address < 0:
+            continue
+        decoded = _decode(image, address)
+        if decoded is None:
+            continue
+        rv[address] = decoded
+        code, modes, args = decoded
+        next_address = address + 1 + len(args)
+
+        if code == OpCode.END:
+            continue
+        if code in _jumps and modes[1] == OpMode.IMMEDIATE:
+            todo.append(args[1])
+        # For an unconditional jump the next address is only a guess, decoding data there is harmless
+        todo.append(next_address)
+    return rv
+
+
+def _read(mode: OpMode, arg: int) -> str:
+    if mode == OpMode.POSITION:
+        return f'm[{arg}]'
+    elif mode == OpMode.IMMEDIATE:
+        return f'({arg})'
+    return f'm[rb + {arg}]'
+
+
+def _handler(address: int, code: OpCode, modes: Sequence[OpMode], args: Sequence[int]) -> Optional[List[str]]:
+    next_address = address + 1 + len(args)
+    if code in _operators:
+        if modes[2] == OpMode.IMMEDIATE:
+            return None  # The interpreter raises the fault
+        target = str(args[2]) if modes[2] == OpMode.POSITION else f'rb + {args[2]}'
+        return [
+            f't = {target}',
+            f'm[t] = {_operators[code].format(_read(modes[0], args[0]), _read(modes[1], args[1]))}',
+            f'pc = {next_address}',
+            'if t in cells:',
+            '    prog.invalidate(t)',
+        ]
+    elif code == OpCode.ADJ_BASE:
+        return [
+            f'rb += {_read(modes[0], args[0])}',
+            f'pc = {next_address}',
+        ]
+    elif code in _jumps:
+        # The target is read even when the jump is not taken, a bad address faults as on the interpreter
+        return [
+            f'j = {_read(modes[1], args[1])}',
+            f'pc = j if {_read(modes[0], args[0])} {_jumps[code]} 0 else {next_address}',
+            'jumps -= 1',
+            'if not jumps:',
+            '    break',
+        ]
+    return None  # input, output and end are left to the interpreter
+
+
+def _dispatch(entries: List[int], handlers: Dict[int, List[str]], indent: str) -> List[str]:
+    if len(entries) <= _leaf_size:
+        lines = []
+        for i, address in enumerate(entries):
+            lines.append(f'{indent}{"if" if i == 0 else "elif"} pc == {address}:')
+            lines += [f'{indent}    {line}' for line in handlers[address]]
+        lines += [
+            f'{indent}else:',
+            f'{indent}    break',
+        ]
+        return lines
+
+    middle = len(entries) // 2
+    return (
+        [f'{indent}if pc < {entries[middle]}:'] +
+        _dispatch(entries[:middle], handlers, indent + '    ') +
+        [f'{indent}else:'] +
+        _dispatch(entries[middle:], handlers, indent + '    ')
+    )
+
+
+def transpile(image: Sequence[int]) -> str:
+    """Python module running ``image``, with a dispatch specialised to every reachable address"""
+    handlers = {}
+    sizes = {}
+    for address, (code, modes, args) in sorted(reachable(image).items()):
+        lines = _handler(address, code, modes, args)
+        if lines is not None:
+            handlers[address] = lines
+            sizes[address] = 1 + len(args)
+
+    entries = sorted(handlers)
+    lines = [
+        f'# Generated by common.transpiler (v{_version}) from image {image_hash(image)}',
+        '',
+        '# Transpiled address -> instruction size',
+        f'ENTRIES = {sizes!r}',
+        '',
+        '',
+        'def run(prog, pc, m, cells, dirty, jumps):',
+        '    rb = prog.data_pointer',
+        '    while True:',
+        '        if pc in dirty:',
+        '            break',
+    ]
+    if entries:
+        lines += _dispatch(entries, handlers, '        ')
+    else:
+        lines.append('        break')
+    lines += [
+        '    prog.data_pointer = rb',
+        '    return pc',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def _prune(directory: str):
+    filenames = [
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if filename.startswith('intcode_') and filename.endswith('.py')
+    ]
+    if len(filenames) <= _max_files:
+        return
+    filenames.sort(key=lambda filename: os.stat(filename).st_mtime_ns)
+    for filename in filenames[:len(filenames) - _max_files]:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass  # Pruned by another process
+
+
+def load(image: Sequence[int], directory: Optional[str] = None) -> ModuleType:
+    """Import the module for ``image``, generating it in the cache directory the first time"""
+    key = image_hash(image)
+    if key in _modules:
+        _modules.move_to_end(key)
+        return _modules[key][1]
+
+    if directory is None:
+        directory = cache_directory()
+    filename = os.path.join(directory, f'intcode_{key[:32]}.py')
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'w') as f:
+            f.write(transpile(image))
+        os.replace(tmp_filename, filename)
+        _prune(directory)
+
+    spec = importlib.util.spec_from_file_location(f'intcode_{key[:32]}', filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _modules[key] = (list(image), module)
+    if len(_modules) > _max_modules:
+        _modules.popitem(last=False)
+    return module
+
+
+def _patched(image: List[int], loaded: List[int]) -> Optional[List[int]]:
+    """Cells where ``image`` differs from ``loaded``, None when they are not the same program"""
+    if image == loaded:
+        return []
+    if len(image) != len(loaded):
+        return None
+    rv = []
+    for address, (a, b) in enumerate(zip(image, loaded)):
+        if a != b:
+            rv.append(address)
+            if len(rv) > _max_patched:
+                return None
+    return rv
+
+
+def load_patched(image: List[int], directory: Optional[str] = None) -> Tuple[ModuleType, List[int]]:
+    """
+    Module of a loaded image ``image`` is a patch of, with the patched cells, or the module of ``image`` itself.
+
+    Runs sweeping a few cells of the same image share one module instead of generating one each.
+    """
+    for key, (loaded, module) in reversed(_modules.items()):
+        patched = _patched(image, loaded)
+        if patched is not None:
+            _modules.move_to_end(key)
+            return module, patched
+    return load(image, directory), []
+
+
+class TranspiledEngine:
+    """
+    Execution engine running the transpiled module of the program image.
+
+    The module is picked when the program starts executing. An image differing from an already loaded one in a few
+    cells, like the patched copies of a sweep, reuses its module with those cells dirty. Input, output, end and
+    addresses the analysis did not reach run on the interpreter. Addresses written at runtime are marked dirty and
+    are interpreted from then on. An execution returns after at most ``_max_jumps`` jumps, so step budgets hold.
+    """
+
+    def __init__(self, program: Program):
+        self.program = program
+        self._module = None  # type: Optional[ModuleType]
+        self._dirty = set()  # type: Set[int]
+        self._owners = {}  # type: Dict[int, List[int]]
+
+    def flush(self):
+        self._module = None
+        self._dirty = set()
+        self._owners = {}
+
+    def fork(self, program: Program) -> "TranspiledEngine":
+        rv = self.__class__(program)
+        rv._module = self._module
+        rv._dirty = set(self._dirty)
+        rv._owners = self._owners  # not modified once loaded
+        return rv
+
+    def _load(self):
+        self._module, patched = load_patched(self.program.image())
+        self._owners = {}
+        for address, size in self._module.ENTRIES.items():
+            for cell in range(address, address + size):
+                self._owners.setdefault(cell, []).append(address)
+        self.program._code_cells.update(self._owners)
+        for cell in patched:
+            self.invalidate(cell)
+
+    def invalidate(self, address: int):
+        self._dirty.update(self._owners.get(address, ()))
+
+    def execute(self, pointer: int) -> Optional[int]:
+        if self._module is None:
+            self._load()
+
+        if pointer in self._module.ENTRIES and pointer not in self._dirty:
+            try:
+                return self._module.run(
+                    self.program, pointer, self.program.memory, self.program._code_cells, self._dirty, _max_jumps,
+                )
+            except IndexError:
+                raise MemoryFault(f'In transpiled code from {pointer} - data_pointer={self.program.data_pointer}')
+
+        return Program.execute(self.program, pointer)
+
+
+if __name__ == '__main__':
+    for filename in sys.argv[1:]:
+        module = load(Program.load_memory_from_file(filename))
+        print(f'{filename}: {module.__file__} ({len(module.ENTRIES)} addresses)')
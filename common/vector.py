@@ -0,0 +1,222 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from common.batch import BatchJob, BatchResult, run_job
+from common.intcode import (
+    BaseInstruction, BaseParserError, InputError, InstructionFault, MemoryFault, OpCode, OpMode, Program, RunStatus,
+)
+
+# Status of a machine still running, stopped ones have a RunStatus or _faulted
+_running = -1
+_faulted = -2
+
+# Products below this magnitude fit in int64 even with the rounding of float64
+_exact_product = 2.0 ** 62
+
+
+class ValueOverflow(BaseParserError):
+    """A value computed by a vectorised machine does not fit in int64, a Program computes it exactly"""
+
+
+def _overflows(code: OpCode, a: np.ndarray, b: np.ndarray, result: np.ndarray) -> np.ndarray:
+    """Where ``result`` of ADD or MULT wrapped around"""
+    if code == OpCode.ADD:
+        return ((a < 0) == (b < 0)) & ((result < 0) != (a < 0))
+    rv = np.abs(a.astype(np.float64) * b.astype(np.float64)) >= _exact_product
+    for i in np.flatnonzero(rv).tolist():
+        rv[i] = int(a[i]) * int(b[i]) != int(result[i])  # close to the limit, compare with the exact product
+    return rv
+
+
+_operators = {
+    OpCode.ADD: np.add,
+    OpCode.MULT: np.multiply,
+    OpCode.LT: lambda a, b: (a < b).astype(np.int64),
+    OpCode.EQ: lambda a, b: (a == b).astype(np.int64),
+}
+
+
+class VectorMachines:
+    """
+    Copies of one image run in lock-step, one per entry of ``inputs``, memory is a ``(machines, size)`` int64 matrix.
+
+    At each step the running machines are grouped by the value of the instruction at their pointer, and each group
+    executes as one vectorised operation: machines running the same code stay together and those that diverge are
+    regrouped by what they execute. A machine stops on END (HALTED), on an INPUT with nothing left to read (BLOCKED,
+    its pointer stays on the INPUT) or on a fault, kept in ``errors``.
+
+    A machine computing a value that does not fit in int64 is faulted with ValueOverflow. Addresses must be below
+    ``size``, which defaults to the length of the image.
+    """
+
+    def __init__(
+        self,
+        image: Sequence[int],
+        inputs: Sequence[Sequence[int]],
+        patches: Optional[Sequence[Optional[Dict[int, int]]]] = None,
+        size: Optional[int] = None,
+    ):
+        n = len(inputs)
+        self.memory = np.zeros((n, max(len(image), size or 0)), dtype=np.int64)
+        self.memory[:, :len(image)] = np.asarray(image, dtype=np.int64)
+        for row, row_patches in enumerate(patches or ()):
+            for address, value in (row_patches or {}).items():
+                self.memory[row, address] = value
+
+        self.pointer = np.zeros(n, dtype=np.int64)
+        self.data_pointer = np.zeros(n, dtype=np.int64)
+        self.status = np.full(n, _running, dtype=np.int64)
+        self.errors = [None] * n  # type: List[Optional[BaseParserError]]
+        self.outputs = [[] for _ in range(0, n)]  # type: List[List[int]]
+        self.steps = 0
+
+        self._inputs = np.zeros((n, max(map(len, inputs), default=0)), dtype=np.int64)
+        for row, values in enumerate(inputs):
+            self._inputs[row, :len(values)] = values
+        self._input_count = np.array([len(values) for values in inputs], dtype=np.int64)
+        self._cursor = np.zeros(n, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.status)
+
+    def _fault(self, rows: np.ndarray, error: BaseParserError):
+        self.status[rows] = _faulted
+        for row in rows.tolist():
+            self.errors[row] = error
+
+    def _execute(self, op_value: int, rows: np.ndarray):
+        try:
+            instruction = Program.instructions[BaseInstruction.opcode_from_value(op_value)]
+            modes = instruction.param_modes(op_value)
+        except InstructionFault as e:
+            self._fault(rows, e)
+            return
+        code = instruction.code
+        if instruction.writes and modes[-1] == OpMode.IMMEDIATE:
+            self._fault(rows, InstructionFault(f'Output param of {op_value} cannot be immediate'))
+            return
+
+        # Addresses out of the memory are clipped to read something and their machines are faulted before any effect
+        size = self.memory.shape[1]
+        pointers = self.pointer[rows]
+        bad = np.zeros(len(rows), dtype=bool)
+
+        def cell(addresses: np.ndarray) -> np.ndarray:
+            nonlocal bad
+            bad |= (addresses < 0) | (addresses >= size)
+            return np.clip(addresses, 0, size - 1)
+
+        args = [self.memory[rows, cell(pointers + 1 + i)] for i in range(0, instruction.params)]
+        addresses = [
+            None if mode == OpMode.IMMEDIATE else
+            cell(arg if mode == OpMode.POSITION else self.data_pointer[rows] + arg)
+            for mode, arg in zip(modes, args)
+        ]
+        if bad.any():
+            self._fault(rows[bad], MemoryFault(f'On {op_value} - address out of the {size} cells'))
+            keep = ~bad
+            rows, pointers = rows[keep], pointers[keep]
+            args = [arg[keep] for arg in args]
+            addresses = [None if address is None else address[keep] for address in addresses]
+            if not len(rows):
+                return
+
+        read = instruction.params - instruction.writes
+        values = [
+            args[i] if addresses[i] is None else self.memory[rows, addresses[i]]
+            for i in range(0, read)
+        ]
+        next_pointers = pointers + 1 + instruction.params
+
+        if code in _operators:
+            with np.errstate(over='ignore'):
+                result = _operators[code](values[0], values[1])
+            if code in (OpCode.ADD, OpCode.MULT):
+                overflow = _overflows(code, values[0], values[1], result)
+                if overflow.any():
+                    self._fault(rows[overflow], ValueOverflow(f'On {op_value} - value out of int64'))
+                    keep = ~overflow
+                    rows, result, next_pointers = rows[keep], result[keep], next_pointers[keep]
+                    addresses[2] = addresses[2][keep]
+            self.memory[rows, addresses[2]] = result
+        elif code in (OpCode.JMP_TRUE, OpCode.JMP_FALSE):
+            jump = (values[0] != 0) if code == OpCode.JMP_TRUE else (values[0] == 0)
+            next_pointers = np.where(jump, values[1], next_pointers)
+        elif code == OpCode.ADJ_BASE:
+            bases = self.data_pointer[rows]
+            with np.errstate(over='ignore'):
+                result = bases + values[0]
+            overflow = _overflows(OpCode.ADD, bases, values[0], result)
+            if overflow.any():
+                self._fault(rows[overflow], ValueOverflow(f'On {op_value} - relative base out of int64'))
+                keep = ~overflow
+                rows, result, next_pointers = rows[keep], result[keep], next_pointers[keep]
+            self.data_pointer[rows] = result
+        elif code == OpCode.INPUT:
+            blocked = self._cursor[rows] >= self._input_count[rows]
+            self.status[rows[blocked]] = RunStatus.BLOCKED
+            ready = ~blocked
+            rows, next_pointers = rows[ready], next_pointers[ready]
+            self.memory[rows, addresses[0][ready]] = self._inputs[rows, self._cursor[rows]]
+            self._cursor[rows] += 1
+        elif code == OpCode.OUTPUT:
+            for row, value in zip(rows.tolist(), values[0].tolist()):
+                self.outputs[row].append(value)
+        elif code == OpCode.END:
+            self.status[rows] = RunStatus.HALTED
+            return
+
+        self.pointer[rows] = next_pointers
+
+    def step(self) -> int:
+        """Execute one instruction on every running machine, returns how many were running"""
+        rows = np.flatnonzero(self.status == _running)
+        if not len(rows):
+            return 0
+        pointers = self.pointer[rows]
+        outside = (pointers < 0) | (pointers >= self.memory.shape[1])
+        if outside.any():
+            self._fault(rows[outside], MemoryFault('Pointer out of the memory'))
+            rows, pointers = rows[~outside], pointers[~outside]
+
+        op_values = self.memory[rows, pointers]
+        for op_value in np.unique(op_values).tolist():
+            self._execute(op_value, rows[op_values == op_value])
+        self.steps += 1
+        return len(rows)
+
+    def run(self):
+        """Step until every machine stopped"""
+        while self.step():
+            pass
+
+    @property
+    def return_codes(self) -> List[Optional[int]]:
+        """memory[0] of the machines that halted"""
+        return [
+            int(value) if status == RunStatus.HALTED else None
+            for value, status in zip(self.memory[:, 0].tolist(), self.status.tolist())
+        ]
+
+
+def run_vectorised(image: Sequence[int], jobs: Sequence[BatchJob], size: Optional[int] = None) -> List[BatchResult]:
+    """
+    Like common.batch.run_batch() but running every job in lock-step in this process, results are in job order.
+
+    A job left waiting for input gets an InputError, as a Program running out of inputs. Jobs computing values that do
+    not fit in int64 run again on a Program, which computes them exactly.
+    """
+    machines = VectorMachines(image, [job.inputs for job in jobs], [job.patches for job in jobs], size=size)
+    machines.run()
+    rv = []
+    for index, (job, return_code) in enumerate(zip(jobs, machines.return_codes)):
+        error = machines.errors[index]
+        if isinstance(error, ValueOverflow):
+            padded = list(image) + [0] * ((size or 0) - len(image))
+            rv.append(run_job(padded, job)._replace(index=index))
+            continue
+        if machines.status[index] == RunStatus.BLOCKED:
+            error = InputError(f'Nothing to read - pointer={machines.pointer[index]}')
+        rv.append(BatchResult(index, job, return_code, machines.outputs[index], error))
+    return rv
@@ -1,10 +1,15 @@
 import logging
-from typing import Optional, Tuple
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from common.intcode import BaseParserError, Program
+from common.batch import map_image
+from common.intcode import BaseParserError, BudgetExceeded, Program, RunStatus
+from day_02.symbolic import SymbolicEscape, return_code_polynomial, solve
 
 
 class IntCodeProgram(Program):
+    # Cells set to param_a and param_b
+    param_cells = (1, 2)
 
     @classmethod
     def run_from_file(cls, filename: str, param_a: int, param_b: int, **kwargs) -> "Program":
@@ -12,32 +17,102 @@ class IntCodeProgram(Program):
         program.run(param_a, param_b)
         return program
 
-    def run(self, param_a: int = None, param_b: int = None) -> int:
+    def run(self, param_a: int = None, param_b: int = None, max_steps: Optional[int] = None, **kwargs) -> int:
+        """Run with the params, raises BudgetExceeded when preempted. Other arguments go to Program.run()"""
         if param_a is not None:
-            self.memory[1] = param_a
+            self.memory[self.param_cells[0]] = param_a
             self.log_debug(f'param_a={param_a}')
         if param_b is not None:
-            self.memory[2] = param_b
+            self.memory[self.param_cells[1]] = param_b
             self.log_debug(f'param_b={param_b}')
-        super(IntCodeProgram, self).run()
+        if super(IntCodeProgram, self).run(max_steps=max_steps, **kwargs) == RunStatus.PREEMPTED:
+            raise BudgetExceeded(f'Preempted - pointer={self.pointer}')
 
         return self.memory[0]
 
+    def sweep(
+        self, params: Iterable[Tuple[int, int]], max_steps: Optional[int] = None,
+    ) -> Iterator[Tuple[int, int, Optional[int], Optional[BaseParserError]]]:
+        """
+        Run from the start once per (param_a, param_b), yielding them with the return code or the fault. A pair still
+        running ``max_steps`` steps after the prefix gets a BudgetExceeded.
 
-def brute_force(init_memory, target: int, r: int) -> Optional[Tuple[int, int]]:
-    print(f'Brute forcing to read {target}')
-    for noun in range(0, r):
-        for verb in range(0, r):
+        The instructions before the first one using a param cell are the same for every pair, they are executed once
+        and each pair runs from a fork of the machine stopped there. With the params in the first instruction, as in
+        day 2, every pair runs from the start.
+        """
+        self.reset_inputs()
+        self.reset_pointers()
+        self.reset_memory()
+        prefix = self.fork()
+        try:
+            prefix.run_until_access(self.param_cells, max_steps)
+        except BaseParserError:
+            prefix = self  # the fault may depend on the params, each pair runs from the start
+
+        for param_a, param_b in params:
+            prog = prefix.fork()
+            prog.store(self.param_cells[0], param_a)
+            prog.store(self.param_cells[1], param_b)
             try:
-                program = IntCodeProgram([m for m in init_memory])
-                program.run(noun, verb)
+                if prog.continue_run(max_steps) == RunStatus.PREEMPTED:
+                    raise BudgetExceeded(f'Still running after {max_steps} steps - pointer={prog.pointer}')
+            except BaseParserError as e:
+                yield param_a, param_b, None, e
+            else:
+                yield param_a, param_b, prog.return_code, None
 
-                if target == program.return_code:
-                    return noun, verb
 
-                print(f'Failed {noun}, {verb} => {program.return_code} != {target}')
-            except BaseParserError as e:
-                print(f'Exception {e.__class__.__name__} for {noun}, {verb}: {str(e)}')
+def _sweep_noun(image: List[int], noun: int, target: int, r: int, max_steps: Optional[int]) -> Optional[int]:
+    """Smallest verb in ``range(r)`` for which the program returns ``target`` with ``noun``"""
+    prog = IntCodeProgram(list(image))
+    for noun, verb, return_code, error in prog.sweep(((noun, verb) for verb in range(0, r)), max_steps):
+        if error is not None:
+            print(f'Exception {error.__class__.__name__} for {noun}, {verb}: {str(error)}')
+        elif return_code == target:
+            return verb
+    return None
+
+
+def brute_force(
+    init_memory,
+    target: int,
+    r: int,
+    max_workers: Optional[int] = None,
+    max_steps: Optional[int] = 10 ** 6,
+) -> Optional[Tuple[int, int]]:
+    """Smallest (noun, verb) in ``range(r)`` returning ``target``, pairs running over ``max_steps`` steps are skipped"""
+    # memory[0] is usually a polynomial of the noun and verb, solve it rather than running every pair
+    try:
+        return_code = return_code_polynomial(init_memory)
+    except SymbolicEscape as e:
+        print(f'Cannot evaluate symbolically: {e}')
+    else:
+        print(f'Solving {return_code} = {target}')
+        return solve(return_code, target, r)
+
+    print(f'Brute forcing to read {target}')
+    # One job sweeps the verbs of a noun from the shared prefix. Jobs finish out of order: the smallest pair is the
+    # smallest noun with a match, known once every noun before it finished
+    found = {}  # type: Dict[int, int]
+    finished = set()
+    lowest_unfinished = 0
+    fn = partial(_sweep_noun, target=target, r=r, max_steps=max_steps)
+    for noun, verb in map_image(init_memory, fn, range(0, r), max_workers=max_workers):
+        if verb is not None:
+            found[noun] = verb
+
+        finished.add(noun)
+        while lowest_unfinished in finished:
+            finished.discard(lowest_unfinished)
+            lowest_unfinished += 1
+        if found and lowest_unfinished > min(found):
+            break
+
+    if found:
+        noun = min(found)
+        return noun, found[noun]
+    return None
 
 
 if __name__ == '__main__':
@@ -52,7 +127,7 @@ if __name__ == '__main__':
     # so param_a and param_b should be within the memory of the program, so we can limit the maximum number of
     # elements to try to brute force the program
     memory = IntCodeProgram.load_memory_from_file('input.txt')
-    found = brute_force(prog, 19690720, len(memory))
+    found = brute_force(memory, 19690720, len(memory))
     if found is not None:
         a, b = found
         print(f'Found answer: {a}, {b}: {100 * a + b}')  # 76, 10 => 7610
@@ -0,0 +1,212 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from common.intcode import BaseInstruction, BaseParserError, OpCode, OpMode, Program
+
+
+class SymbolicEscape(BaseParserError):
+    """A symbol was used where a concrete value is needed: an address, an opcode, a jump or an I/O"""
+
+
+class Polynomial:
+    """Polynomial with int coefficients in named symbols, its terms are kept by tuple of exponents"""
+
+    def __init__(self, symbols: Sequence[str], terms: Dict[Tuple[int, ...], int]):
+        self.symbols = tuple(symbols)
+        self.terms = {
+            exponents: coefficient
+            for exponents, coefficient in terms.items()
+            if coefficient != 0
+        }
+
+    @classmethod
+    def symbol(cls, symbols: Sequence[str], index: int) -> "Polynomial":
+        return cls(symbols, {tuple(int(i == index) for i in range(0, len(symbols))): 1})
+
+    def _terms(self, other: Union[int, "Polynomial"]) -> Dict[Tuple[int, ...], int]:
+        if isinstance(other, Polynomial):
+            return other.terms
+        return {(0,) * len(self.symbols): other}
+
+    def __add__(self, other: Union[int, "Polynomial", "Unknown"]) -> Union["Polynomial", "Unknown"]:
+        if isinstance(other, Unknown):
+            return other
+        terms = dict(self.terms)
+        for exponents, coefficient in self._terms(other).items():
+            terms[exponents] = terms.get(exponents, 0) + coefficient
+        return Polynomial(self.symbols, terms)
+
+    __radd__ = __add__
+
+    def __mul__(self, other: Union[int, "Polynomial", "Unknown"]) -> Union["Polynomial", "Unknown"]:
+        if isinstance(other, Unknown):
+            return other
+        terms = {}
+        for exponents_a, coefficient_a in self.terms.items():
+            for exponents_b, coefficient_b in self._terms(other).items():
+                exponents = tuple(a + b for a, b in zip(exponents_a, exponents_b))
+                terms[exponents] = terms.get(exponents, 0) + coefficient_a * coefficient_b
+        return Polynomial(self.symbols, terms)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (int, Polynomial)):
+            return self.terms == self._terms(other) or (not self.terms and other == 0)
+        return NotImplemented
+
+    def degree(self, index: int) -> int:
+        return max((exponents[index] for exponents in self.terms), default=0)
+
+    def evaluate(self, *values: int) -> int:
+        rv = 0
+        for exponents, coefficient in self.terms.items():
+            term = coefficient
+            for value, exponent in zip(values, exponents):
+                term *= value ** exponent
+            rv += term
+        return rv
+
+    def __repr__(self) -> str:
+        if not self.terms:
+            return '0'
+        parts = []
+        for exponents, coefficient in sorted(self.terms.items()):
+            factors = [
+                name if exponent == 1 else f'{name}^{exponent}'
+                for name, exponent in zip(self.symbols, exponents)
+                if exponent
+            ]
+            if not factors:
+                parts.append(str(coefficient))
+            elif coefficient == 1:
+                parts.append('*'.join(factors))
+            else:
+                parts.append('*'.join([str(coefficient)] + factors))
+        return ' + '.join(parts)
+
+
+class Unknown:
+    """Value read through a symbolic address, anything computed from it is unknown too"""
+
+    def __add__(self, other) -> "Unknown":
+        return self
+
+    __radd__ = __mul__ = __rmul__ = __add__
+
+    def __repr__(self) -> str:
+        return 'unknown'
+
+
+unknown = Unknown()
+
+Value = Union[int, Polynomial, Unknown]
+
+
+class SymbolicProgram:
+    """
+    Runs an image where some cells hold symbols, carrying polynomials through ADD and MULT.
+
+    Reading through a symbolic address gives an unknown value, which is fine as long as it is overwritten before
+    being used. Comparisons and jumps are followed while their operands are concrete. Raises SymbolicEscape as soon
+    as a symbol or an unknown value is needed concretely, or is used to address a write, the caller falls back to
+    concrete runs.
+    """
+
+    def __init__(self, memory: List[int], symbols: Dict[int, str]):
+        names = list(symbols.values())
+        self.memory = list(memory)  # type: List[Value]
+        for index, (address, name) in enumerate(symbols.items()):
+            self.memory[address] = Polynomial.symbol(names, index)
+        self.pointer = 0
+        self.data_pointer = 0
+
+    def _concrete(self, value: Value, what: str) -> int:
+        if isinstance(value, (Polynomial, Unknown)):
+            raise SymbolicEscape(f'{value} used as {what} - pointer={self.pointer}')
+        return value
+
+    def _address(self, mode: OpMode, arg: Value) -> int:
+        arg = self._concrete(arg, 'an address')
+        if mode == OpMode.POSITION:
+            address = arg
+        elif mode == OpMode.RELATIVE:
+            address = self.data_pointer + arg
+        else:
+            raise SymbolicEscape(f'Immediate output - pointer={self.pointer}')
+        if address < 0:
+            raise SymbolicEscape(f'Negative address {address} - pointer={self.pointer}')
+        return address
+
+    def _value(self, mode: OpMode, arg: Value) -> Value:
+        if mode == OpMode.IMMEDIATE:
+            return arg
+        if isinstance(arg, (Polynomial, Unknown)):
+            return unknown
+        return self.memory[self._address(mode, arg)]
+
+    def step(self) -> bool:
+        op_value = self._concrete(self.memory[self.pointer], 'an opcode')
+        instruction = Program.instructions[BaseInstruction.opcode_from_value(op_value)]
+        modes = instruction.param_modes(op_value)
+        args = self.memory[self.pointer + 1:self.pointer + 1 + instruction.params]
+        next_pointer = self.pointer + 1 + instruction.params
+        code = instruction.code
+
+        if code == OpCode.END:
+            return False
+        elif code in (OpCode.ADD, OpCode.MULT):
+            a, b = self._value(modes[0], args[0]), self._value(modes[1], args[1])
+            self.memory[self._address(modes[2], args[2])] = a + b if code == OpCode.ADD else a * b
+        elif code in (OpCode.LT, OpCode.EQ):
+            a = self._concrete(self._value(modes[0], args[0]), 'a comparison')
+            b = self._concrete(self._value(modes[1], args[1]), 'a comparison')
+            self.memory[self._address(modes[2], args[2])] = int(a < b if code == OpCode.LT else a == b)
+        elif code in (OpCode.JMP_TRUE, OpCode.JMP_FALSE):
+            condition = self._concrete(self._value(modes[0], args[0]), 'a jump condition')
+            if (condition != 0) == (code == OpCode.JMP_TRUE):
+                next_pointer = self._concrete(self._value(modes[1], args[1]), 'a jump target')
+        elif code == OpCode.ADJ_BASE:
+            self.data_pointer += self._concrete(self._value(modes[0], args[0]), 'a base offset')
+        else:
+            raise SymbolicEscape(f'{code.name} is not evaluated symbolically - pointer={self.pointer}')
+
+        self.pointer = next_pointer
+        return True
+
+    def run(self) -> List[Value]:
+        try:
+            while self.step():
+                pass
+        except IndexError:
+            raise SymbolicEscape(f'Memory access out of the image - pointer={self.pointer}')
+        return self.memory
+
+
+def return_code_polynomial(init_memory: List[int]) -> Union[int, Polynomial]:
+    """memory[0] once the program ended, as a polynomial in the noun (memory[1]) and verb (memory[2])"""
+    rv = SymbolicProgram(init_memory, {1: 'noun', 2: 'verb'}).run()[0]
+    if isinstance(rv, Unknown):
+        raise SymbolicEscape('memory[0] was read through a symbolic address')
+    return rv
+
+
+def solve(return_code: Union[int, Polynomial], target: int, r: int) -> Optional[Tuple[int, int]]:
+    """Smallest noun then verb in ``range(r)`` for which ``return_code`` is ``target``"""
+    if not isinstance(return_code, Polynomial):
+        return (0, 0) if return_code == target and r > 0 else None
+
+    for noun in range(0, r):
+        # Linear in the verb: solve it directly
+        if return_code.degree(1) <= 1:
+            constant = return_code.evaluate(noun, 0)
+            slope = return_code.evaluate(noun, 1) - constant
+            if slope == 0:
+                if constant == target:
+                    return noun, 0
+            elif (target - constant) % slope == 0 and 0 <= (target - constant) // slope < r:
+                return noun, (target - constant) // slope
+        else:
+            for verb in range(0, r):
+                if return_code.evaluate(noun, verb) == target:
+                    return noun, verb
+    return None
@@ -1,4 +1,9 @@
 
+import time
+
+import pytest
+
+from common.intcode import BudgetExceeded, MemoryFault
 from day_02.intcode_parser import brute_force, IntCodeProgram
 
 
@@ -12,3 +17,47 @@ def test_day_02_slow_second_question():
     found = brute_force(prog, 19690720, len(prog))
     assert found[0] == 76
     assert found[1] == 10
+
+
+class _LateParams(IntCodeProgram):
+    param_cells = (17, 18)
+
+
+def test_sweep_from_prefix():
+    prog = _LateParams([
+        1101, 5, 6, 19,  # *19 = 11, does not use the params
+        1002, 19, 2, 20,  # *20 = *19 * 2
+        1, 17, 18, 0,  # *0 = *17 + *18
+        2, 0, 20, 0,  # *0 *= *20
+        99,
+        0, 0, 0, 0,
+    ])
+    executed = []
+    prog.set_tracer(lambda record: executed.append(record.address))
+    results = list(prog.sweep([(1, 2), (3, 4)]))
+    assert results == [(1, 2, 66, None), (3, 4, 154, None)]
+    assert executed.count(0) == 1, 'The prefix is executed once'
+    assert executed.count(4) == 1
+    assert executed.count(8) == 2
+
+
+def test_sweep_faults():
+    prog = IntCodeProgram([1, 0, 0, 0, 99])
+    results = list(prog.sweep([(0, 0), (10, 0)]))
+    assert results[0] == (0, 0, 2, None)
+    assert results[1][2] is None
+    assert isinstance(results[1][3], MemoryFault)
+
+
+def test_run_max_steps():
+    # *0 = param_a * param_b, then loops forever unless it is 0
+    image = [1102, 0, 0, 0, 1005, 0, 4, 99]
+    assert IntCodeProgram(list(image)).run(0, 5, max_steps=10) == 0
+    with pytest.raises(BudgetExceeded):
+        IntCodeProgram(list(image)).run(3, 5, max_steps=10)
+    with pytest.raises(BudgetExceeded):
+        IntCodeProgram(list(image)).run(3, 5, deadline=time.monotonic())
+
+    results = list(IntCodeProgram(list(image)).sweep([(3, 5), (0, 3)], max_steps=10))
+    assert isinstance(results[0][3], BudgetExceeded)
+    assert results[1] == (0, 3, 0, None)
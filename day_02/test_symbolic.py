@@ -0,0 +1,80 @@
+import pytest
+
+from day_02.intcode_parser import brute_force, IntCodeProgram
+from day_02.symbolic import Polynomial, SymbolicEscape, return_code_polynomial, solve
+
+
+def test_polynomial():
+    noun = Polynomial.symbol(('noun', 'verb'), 0)
+    verb = Polynomial.symbol(('noun', 'verb'), 1)
+    p = 3 * noun * noun + verb * 2 + 5
+    assert repr(p) == '5 + 2*verb + 3*noun^2'
+    assert p.evaluate(2, 1) == 19
+    assert p.degree(0) == 2
+    assert p.degree(1) == 1
+    assert noun + 0 == noun
+    assert noun * 0 == 0
+
+
+def test_day_02_polynomial():
+    prog = IntCodeProgram.load_memory_from_file('input.txt')
+    return_code = return_code_polynomial(prog)
+    assert return_code.evaluate(12, 2) == 3765464
+    assert solve(return_code, 19690720, len(prog)) == (76, 10)
+
+
+def test_unknown_overwritten():
+    # *3 = *noun + *verb is dropped, then *0 = noun * verb + 1
+    prog = [1, 0, 0, 3, 2, 1, 2, 0, 1001, 0, 1, 0, 99]
+    assert repr(return_code_polynomial(prog)) == '1 + noun*verb'
+
+
+@pytest.mark.parametrize('prog', (
+    [1, 0, 0, 0, 99],  # *0 = *noun + *verb
+    [1005, 1, 5, 99, 99, 99],  # jump if noun
+    [1101, 0, 0, 0, 1001, 1, 0, 11, 1101, 1, 1, 0, 99],  # *11 = noun then write through it
+    [3, 0, 99],  # input
+))
+def test_escape(prog):
+    with pytest.raises(SymbolicEscape):
+        return_code_polynomial(prog)
+
+
+def test_solve_non_linear():
+    noun = Polynomial.symbol(('noun', 'verb'), 0)
+    verb = Polynomial.symbol(('noun', 'verb'), 1)
+    assert solve(noun * verb * verb + 1, 19, 10) == (2, 3)
+    assert solve(noun * verb * verb + 1, 20, 10) is None
+    assert solve(noun + 7, 9, 10) == (2, 0)
+
+
+@pytest.mark.parametrize('max_workers', (1, 2))
+def test_brute_force_fallback(max_workers):
+    prog = [
+        1101, 0, 0, 20,  # *20 = noun + verb
+        1005, 20, 9,  # if *20 goto 9, a symbolic jump
+        99, 0,
+        1001, 20, 100, 0,  # *0 = *20 + 100
+        99,
+    ] + [0] * 7
+    # (0, 3), (1, 2), (2, 1) and (3, 0) all match
+    assert brute_force(prog, 103, len(prog), max_workers=max_workers) == (0, 3)
+
+
+def test_brute_force_looping_pair():
+    prog = [
+        1101, 0, 0, 20,  # *20 = noun + verb
+        1005, 20, 10,  # if *20 goto 10
+        1105, 1, 4,  # loop forever
+        1001, 20, 100, 0,  # *0 = *20 + 100
+        99,
+    ] + [0] * 6
+    assert brute_force(prog, 103, len(prog), max_workers=1, max_steps=100) == (0, 3), '(0, 0) is skipped'
+
+
+def test_brute_force_unknown_operand():
+    # *0 = noun + *verb, the verb is an address so the sum is unknown
+    prog = [101, 0, 0, 0, 99]
+    with pytest.raises(SymbolicEscape):
+        return_code_polynomial(prog)
+    assert brute_force(prog, 5, len(prog), max_workers=1) == (3, 2)
@@ -18,13 +18,14 @@ if __name__ == '__main__':
     logging.basicConfig(level=logging.DEBUG)
     init_memory = DiagnosticProgram.load_memory_from_file('input.txt')
 
-    prog = DiagnosticProgram([m for m in init_memory], verbose=True)
+    base = DiagnosticProgram(init_memory, verbose=True)
+    prog = base.fork()
     diagnostic_code = prog.run(1)
     print(f'Outputs are {", ".join(map(str, prog.outputs))}')
     print(f'Aircon diagnostic is {diagnostic_code}')  # 9654885
 
     # Just in case the memory is modified
-    prog = DiagnosticProgram([m for m in init_memory])
+    prog = base.fork()
     diagnostic_code = prog.run(5)
     print(f'Outputs are {", ".join(map(str, prog.outputs))}')
     print(f'Thermal radiator diagnostic is {diagnostic_code}')  # 7079459
@@ -1,22 +1,25 @@
+from functools import partial
 from itertools import permutations
 from operator import itemgetter
-from typing import List, Iterable, Dict, Tuple
+from typing import List, Iterable, Dict, Optional, Tuple
 
-from common.intcode import Program, InputError
+from common.batch import map_image
+from common.intcode import Program
+from common.scheduler import run_scheduled
 
 
 class ThrusterAmplifiers:
 
-    def __init__(self, initial_memory: List[int]):
-        self._initial_memory = initial_memory
+    def __init__(self, initial_memory: List[int], engine: str = 'compiled', max_workers: Optional[int] = None):
+        self._base = Program(initial_memory, engine=engine)
+        self.engine = engine
+        self.max_workers = max_workers
 
     def run_serial(self, phase_settings: Iterable[int]) -> int:
         current_input = 0
         for i, setting in enumerate(phase_settings):
-            prog = Program(
-                [m for m in self._initial_memory],
-                [setting, current_input],
-            )
+            prog = self._base.fork()
+            prog.reset_inputs([setting, current_input])
             prog.run()
             if not prog.outputs:
                 raise RuntimeError(f'Setting {i}: {setting} with input {current_input} did not provide output')
@@ -25,9 +28,11 @@ class ThrusterAmplifiers:
         return current_input
 
     def try_all_serial(self, initial_code: List[int]) -> Tuple[List[int], int]:
+        sequences = list(permutations(initial_code))
+        run = partial(_run_serial, engine=self.engine)
         rv: Dict[List[int], int] = {
-            sequence: self.run_serial(sequence)
-            for sequence in permutations(initial_code)
+            sequences[index]: output
+            for index, output in map_image(self._base.image(), run, sequences, max_workers=self.max_workers)
         }
 
         print(f'Generated {len(rv)} combinations [serial]')
@@ -35,60 +40,48 @@ class ThrusterAmplifiers:
         sorted_rv = sorted(rv.items(), key=itemgetter(1))  # type: List[Tuple[List[int], int]]
         return sorted_rv[-1]
 
-    def run_parallel(self, phase_settings: List[int], feedback=True) -> int:
-        # TODO(tr) Linkling the input to output like that is a bit disgusting, we should create a special generator
-        #  so that we can reset the output on the start of run()
-        programs = [
-            Program([m for m in self._initial_memory]),
-        ]
-        for i, setting in enumerate(phase_settings[1:], start=1):
-            programs[i - 1].outputs = [setting]
+    def try_all_serial_vectorised(self, initial_code: List[int]) -> Tuple[List[int], int]:
+        """try_all_serial() running every permutation in lock-step on common.vector, amplifier by amplifier"""
+        from common.vector import VectorMachines
+
+        sequences = list(permutations(initial_code))
+        signals = [0] * len(sequences)
+        for stage in range(0, len(initial_code)):
+            machines = VectorMachines(
+                self._base.image(), [[sequence[stage], signal] for sequence, signal in zip(sequences, signals)],
+            )
+            machines.run()
+            for index, outputs in enumerate(machines.outputs):
+                if not outputs:
+                    raise RuntimeError(f'Setting {sequences[index]}: amplifier {stage} did not provide output')
+            signals = [outputs[0] for outputs in machines.outputs]
 
-            prog = Program([m for m in self._initial_memory], inputs=programs[i - 1].outputs)
-            programs.append(prog)
+        print(f'Generated {len(sequences)} combinations [vectorised]')
+        return max(zip(sequences, signals), key=itemgetter(1))
 
-        if feedback:
-            programs[-1].outputs = [phase_settings[0], 0]
-            programs[0].reset_inputs(programs[-1].outputs)
-        else:
-            programs[0].reset_inputs([phase_settings[0], 0])
-
-        input_errors = {
-            i: False
-            for i in range(0, len(programs))
+    def run_parallel(self, phase_settings: List[int], feedback=True) -> int:
+        # Each amplifier reads its phase setting then what the previous one outputs
+        topology = {
+            i: [i + 1]
+            for i in range(0, len(phase_settings) - 1)
         }
-        finished = {
-            i: False
-            for i in range(0, len(programs))
+        if feedback:
+            topology[len(phase_settings) - 1] = [0]
+        initial_inputs = {
+            i: [setting]
+            for i, setting in enumerate(phase_settings)
         }
+        initial_inputs[0].append(0)
 
-        global_pointer = 1
-        while not all(finished.values()):
-            for i, p in enumerate(programs):
-                try:
-                    if p.pointer is not None:
-                        p.pointer = p.execute(p.pointer)
-                    else:
-                        # print(f'Skipping program {i}')
-                        finished[i] = True
-                except InputError:
-                    # print(f'Ignoring input error from program {i}')  # IO wait
-                    input_errors[i] = True
-                else:
-                    input_errors[i] = False
-
-            if all(input_errors.values()):
-                raise RuntimeError('Deadlock')
-
-            global_pointer += 1
-
-        print(f'Done in {global_pointer} iterations')
-        return programs[-1].outputs[-1]
+        outputs = run_scheduled([self._base.fork() for _ in phase_settings], topology, initial_inputs)
+        return outputs[-1][-1]
 
     def try_all_parallel(self, initial_code: List[int], feedback=True) -> Tuple[List[int], int]:
+        sequences = list(permutations(initial_code))
+        run = partial(_run_parallel, engine=self.engine, feedback=feedback)
         rv: Dict[List[int], int] = {
-            settings: self.run_parallel(settings, feedback)
-            for settings in permutations(initial_code)
+            sequences[index]: output
+            for index, output in map_image(self._base.image(), run, sequences, max_workers=self.max_workers)
         }
 
         print(f'Generated {len(rv)} combinations [parallel]')
@@ -97,6 +90,15 @@ class ThrusterAmplifiers:
         return sorted_rv[-1]
 
 
+# Run in the worker processes of try_all_serial and try_all_parallel
+def _run_serial(image: List[int], phase_settings: Iterable[int], engine: str) -> int:
+    return ThrusterAmplifiers(image, engine=engine).run_serial(phase_settings)
+
+
+def _run_parallel(image: List[int], phase_settings: List[int], engine: str, feedback: bool) -> int:
+    return ThrusterAmplifiers(image, engine=engine).run_parallel(phase_settings, feedback)
+
+
 if __name__ == '__main__':
 
     thrusters_program = ThrusterAmplifiers(Program.load_memory_from_file('input.txt'))
@@ -1,3 +1,5 @@
+import pytest
+
 from common.intcode import Program
 from day_07.amplifier_circuit import ThrusterAmplifiers
 
@@ -96,6 +98,14 @@ def test_first_question():
     assert output == 116680
 
 
+def test_first_question_vectorised():
+    pytest.importorskip('numpy')
+    thrusters_program = ThrusterAmplifiers(Program.load_memory_from_file('input.txt'))
+
+    expected = thrusters_program.try_all_serial([0, 1, 2, 3, 4])
+    assert thrusters_program.try_all_serial_vectorised([0, 1, 2, 3, 4]) == expected
+
+
 def test_second_question():
     thrusters_program = ThrusterAmplifiers(Program.load_memory_from_file('input.txt'))
 
@@ -53,6 +53,18 @@ def test_question_1():
     assert test_prog.outputs == [3638931938]
 
 
+def test_question_1_paged():
+    test_prog = Program(
+        Program.load_memory_from_file('input.txt'),
+        inputs=[1],
+        dynamic_memory='paged',
+    )
+
+    test_prog.run()
+
+    assert test_prog.outputs == [3638931938]
+
+
 def test_slow_question_2():
     boost_prog = Program(
         Program.load_memory_from_file('input.txt'),
@@ -1,9 +1,10 @@
+from collections import deque
 from enum import Enum, unique, IntEnum
-from typing import List, Dict, Set, Optional, Tuple
+from typing import List, Dict, Set, Optional, Tuple, Deque
 
 import attr
 
-from common.intcode import Program, InputError
+from common.intcode import Program, RunStatus
 
 
 @unique
@@ -70,13 +71,13 @@ class RobotPainter:
 
     def __init__(self):
         self.init_memory: List[int] = Program.load_memory_from_file('input.txt')
-        self.panels: List[int] = []
+        self.panels: Deque[int] = deque()  # colours under the robot, consumed by the program
         self.position: Position = Position(0, 0)
         self.facing = Facing.Up
         self.hull: Dict[Position, int] = {}
 
     def reset(self, start_position):
-        self.panels: List[int] = []
+        self.panels: Deque[int] = deque()
         self.hull: Dict[Position, int] = {}
 
         self.move_to(start_position, Facing.Up)
@@ -86,7 +87,6 @@ class RobotPainter:
         if p not in self.hull:
             self.hull[p] = self.Black
         self.facing = facing
-        self.panels.append(self.hull[self.position])
 
     def run(self, start_position: Position=None, start_colour: int=Black, debug=False):
         if start_position is None:
@@ -95,24 +95,26 @@ class RobotPainter:
 
         if start_colour != self.Black:
             self.hull[self.position] = self.White
-            self.panels[0] = self.White
 
-        program = Program(self.init_memory, self.panels, dynamic_memory=True)
-
-        output_pointer = 0
-        program.reset_inputs()
-        program.reset_memory()
-        program.reset_pointers()
-        while program.pointer is not None:
-            program.pointer = program.execute(program.pointer)
-
-            if len(program.outputs) >= output_pointer + 2:
-                if debug:
-                    print(f'Got outputs: {", ".join(map(str, program.outputs[output_pointer:]))}')
-
-                self.hull[self.position] = program.outputs[output_pointer]
-                p, facing = self.position.move(self.facing, program.outputs[output_pointer + 1])
-                output_pointer += 2
+        program = Program(
+            self.init_memory,
+            self.panels,
+            dynamic_memory=True,
+            engine='compiled',
+            outputs=deque(maxlen=2),
+        )
+
+        moves = 0
+        while True:
+            # The program reads the colour under the robot then paints and turns before reading again
+            status, values = program.run_until_input()
+            if debug and values:
+                print(f'Got outputs: {", ".join(map(str, values))}')
+
+            for colour, direction in zip(values[::2], values[1::2]):
+                self.hull[self.position] = colour
+                p, facing = self.position.move(self.facing, direction)
+                moves += 1
                 old_position = self.position
                 old_facing = self.facing
                 self.move_to(p, facing)
@@ -120,7 +122,11 @@ class RobotPainter:
                 if debug:
                     print(f'Robot is moving from {old_position} {old_facing} to {self.position} {self.facing}')
 
-        print(f'Robot moved {output_pointer // 2} times')
+            if status == RunStatus.HALTED:
+                break
+            self.panels.append(self.hull[self.position])
+
+        print(f'Robot moved {moves} times')
 
     def hull_as_str(self, print_robot: bool=False) -> List[str]:
         max_p = Position(0, 0)
@@ -1,9 +1,10 @@
+from collections import deque
 from enum import IntEnum, unique
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 import attr
 
-from common.intcode import Program, InputError
+from common.intcode import Program, InputError, RunStatus
 
 
 @unique
@@ -27,10 +28,15 @@ class Arcade:
     def __init__(self):
         self.screen: Dict[Position, Tile] = {}
         self.score = 0
+        self._track: Dict[Tile, Optional[Position]] = {}
 
     def reset(self):
         self.screen = {}
         self.score = 0
+        self._track = {
+            Tile.Ball: None,
+            Tile.HorizontalPaddle: None,
+        }
 
     def print_screen(self):
         max_x = 0
@@ -58,79 +64,82 @@ class Arcade:
                     raise RuntimeError('Unknown tile')
             print(row)
 
+    def draw(self, values: List[int], auto_play=False):
+        for x, y, value in zip(values[::3], values[1::3], values[2::3]):
+            pos = Position(x, y)
+            if pos == self._score_position:
+                self.score = value
+            else:
+                tile = Tile(value)
+                self.screen[pos] = tile
+
+                if auto_play and tile in self._track:
+                    print(f'Tracking {tile} as {pos}')
+                    self._track[tile] = pos
+
     def run(self, init_memory: List[int], interactive=False, init_inputs=None, auto_play=False):
         self.reset()
         if init_inputs is None:
-            inputs = []
+            inputs = deque()
         else:
-            inputs = init_inputs
-        program = Program(init_memory, inputs=inputs, dynamic_memory=True)
-
+            inputs = deque(init_inputs)
+        moves = []  # joystick moves typed in interactive mode, to replay them later
         if interactive or auto_play:
             init_memory[0] = 2
+        program = Program(
+            init_memory,
+            inputs=inputs,
+            dynamic_memory=True,
+            engine='compiled',
+            outputs=deque(maxlen=3),
+        )
 
-        output_idx = 0
         max_blocks = None
-        track = {
-            Tile.Ball: None,
-            Tile.HorizontalPaddle: None,
-        }
+        track = self._track
+
+        while True:
+            # Every frame is drawn before the game reads the joystick
+            status, values = program.run_until_input()
+            self.draw(values, auto_play)
+            if status == RunStatus.HALTED:
+                break
+
+            if interactive:
+                n_blocks = sum((1 for t in self.screen.values() if t == Tile.Block))
+                if max_blocks is None:
+                    max_blocks = n_blocks
+                else:
+                    print(f'score/block={self.score / max_blocks}')
+                print(f'Pointer: {program.pointer}, moves={len(moves)}, n_blocks={n_blocks}')
+                self.print_screen()
+                # Read console to know if we move the joystick
+                key = input('Joystick (Q=left, P=Right): ')
+                if not key:
+                    moves.append(0)
+                elif key.lower() == 'q':
+                    moves.append(-1)
+                elif key.lower() == 'p':
+                    moves.append(1)
+                else:
+                    raise InputError(f'Unknown joystick move {key}')
+                inputs.append(moves[-1])
+            elif auto_play:
+                if None in track.values():
+                    raise InputError('Cannot find the ball and the paddle')
+                ball_pos = track[Tile.Ball]
+                paddle_pos = track[Tile.HorizontalPaddle]
+
+                if ball_pos.x > paddle_pos.x:
+                    inputs.append(1)
+                elif ball_pos.x < paddle_pos.x:
+                    inputs.append(-1)
+                else:
+                    inputs.append(0)
+                self.print_screen()
+            else:
+                break  # Nobody holds the joystick
 
-        while program.pointer is not None:
-            try:
-                program.pointer = program.execute(program.pointer)
-
-                if len(program.outputs) >= output_idx + 3:
-
-                    # Read one entry
-                    pos = Position(
-                        program.outputs[output_idx],
-                        program.outputs[output_idx + 1],
-                    )
-                    if pos == self._score_position:
-                        self.score = program.outputs[output_idx + 2]
-                    else:
-                        tile = Tile(program.outputs[output_idx + 2])
-                        self.screen[pos] = tile
-
-                        if auto_play and tile in track:
-                            print(f'Tracking {tile} as {pos}')
-                            track[tile] = pos
-
-            except InputError:
-                if interactive:
-                    n_blocks = sum((1 for t in self.screen.values() if t == Tile.Block))
-                    if max_blocks is None:
-                        max_blocks = n_blocks
-                    else:
-                        print(f'score/block={self.score / max_blocks}')
-                    print(f'Pointer: {program.pointer}, inputs={len(inputs)}, n_blocks={n_blocks}')
-                    self.print_screen()
-                    # Read console to know if we move the joystick
-                    key = input('Joystick (Q=left, P=Right): ')
-                    if not key:
-                        inputs.append(0)
-                    elif key.lower() == 'q':
-                        inputs.append(-1)
-                    elif key.lower() == 'p':
-                        inputs.append(1)
-                    else:
-                        raise
-                elif auto_play:
-                    if None in track.values():
-                        raise
-                    ball_pos = track[Tile.Ball]
-                    paddle_pos = track[Tile.HorizontalPaddle]
-
-                    if ball_pos.x > paddle_pos.x:
-                        inputs.append(1)
-                    elif ball_pos.x < paddle_pos.x:
-                        inputs.append(-1)
-                    else:
-                        inputs.append(0)
-                    self.print_screen()
-
-        return inputs
+        return moves
 
 
 if __name__ == '__main__':
@@ -151,7 +160,7 @@ if __name__ == '__main__':
     #     -1,
     # ]
     # len_ = len(init_inputs)
-    inputs = arcade.run(
+    moves = arcade.run(
         Program.load_memory_from_file('input.txt'),
         # interactive=True,
         # init_inputs=init_inputs,
@@ -163,4 +172,4 @@ if __name__ == '__main__':
     print(f'After running there are {n_blocks} on the screen. The score is {arcade.score}')
 
     arcade.print_screen()
-    # print(f'Saved moves: {inputs[len_:]}')
+    # print(f'Saved moves: {moves}')
@@ -1,3 +1,4 @@
+from collections import deque
 from datetime import datetime
 from enum import IntEnum, unique
 from random import choice, seed
@@ -5,7 +6,7 @@ from typing import Dict, List, Callable, Generator, Tuple, Optional
 
 import attr
 
-from common.intcode import Program
+from common.intcode import Program, RunStatus
 
 
 @unique
@@ -85,7 +86,7 @@ class AllDone(RuntimeError):
 class Droid(Program):
 
     def __init__(self, filename: str):
-        super(Droid, self).__init__(Program.load_memory_from_file(filename), dynamic_memory=True)
+        super(Droid, self).__init__(Program.load_memory_from_file(filename), dynamic_memory=True, engine='compiled')
         self.map: Dict[Position, Cell] = {}
         self.current_status = Status.MoveOk
         self.current_position = Position(0, 0)
@@ -222,8 +223,8 @@ class Droid(Program):
         }
 
         try:
-            while True:
-                self.pointer = self.execute(self.pointer)
+            while self.run_until_output()[0] == RunStatus.OUTPUT:
+                pass
         except AllDone:
             pass
 
@@ -243,6 +244,43 @@ class Droid(Program):
         # 3. read output
 
 
+def explore(filename: str) -> Dict[Position, Cell]:
+    """
+    Map the area with a breadth first search.
+
+    Every reached position keeps its own machine, moving in a new direction forks it instead of replaying the
+    moves from the start.
+    """
+    start = Position(0, 0)
+    area = {start: Cell(0, is_corridor=True)}
+    program = Program(Program.load_memory_from_file(filename), dynamic_memory='paged', outputs=deque(maxlen=1))
+    to_visit = deque([(start, program)])
+
+    while to_visit:
+        position, program = to_visit.popleft()
+        for direction, neighbour in position.all_neighbours():
+            if neighbour in area:
+                continue
+
+            droid = program.fork()
+            droid.reset_inputs([direction.value])
+            _, values = droid.run_until_output()
+
+            status = Status(values[0])
+            if status == Status.WallFound:
+                area[neighbour] = Cell(None)
+                continue
+
+            area[neighbour] = Cell(
+                area[position].distance_to_s + 1,
+                is_corridor=status == Status.MoveOk,
+                is_oxygen=status == Status.FoundOxygenTank,
+            )
+            to_visit.append((neighbour, droid))
+
+    return area
+
+
 if __name__ == '__main__':
 
     droid = Droid('input.txt')
@@ -253,3 +291,8 @@ if __name__ == '__main__':
 
     print(f'Found oxygen tank at {oxygen} ({droid.map[oxygen].distance_to_s}) seed={chosen_seed}')
     droid.print_map(droid.current_position)  # 188 is too low...
+
+    area = explore('input.txt')
+    for p, c in area.items():
+        if c.is_oxygen:
+            print(f'Breadth first search found the oxygen tank at {p} ({c.distance_to_s})')
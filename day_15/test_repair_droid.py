@@ -0,0 +1,9 @@
+from day_15.repair_droid import explore, Position
+
+
+def test_explore_question_1():
+    area = explore('input.txt')
+
+    oxygen = [p for p, c in area.items() if c.is_oxygen]
+    assert oxygen == [Position(-12, -12)]
+    assert area[oxygen[0]].distance_to_s == 212